@@ -1,7 +1,8 @@
 import streamlit as st
 import os
+from itertools import islice
 from backend.auth import check_authentication, render_login
-from backend.utils import initialize_session_state
+from backend.utils import initialize_session_state, average_quiz_score
 
 # Page configuration
 st.set_page_config(
@@ -13,8 +14,8 @@ st.set_page_config(
 
 # Initialize database schema on first run
 try:
-    from backend.database import Database
-    db = Database()
+    from backend.database import get_db
+    db = get_db()
     db.init_schema()
 except Exception as e:
     st.warning(f"Database initialization: {str(e)[:100]}. Using session-only storage.")
@@ -53,28 +54,33 @@ Transform your documents and academic papers into interactive learning experienc
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
+    # Count in the database when available instead of relying on the loaded list
+    doc_count = None
+    if st.session_state.get('user_id'):
+        try:
+            from backend.database import cached_document_count
+            doc_count = cached_document_count(st.session_state.user_id)
+        except Exception:
+            pass
     st.metric(
         label="📄 Documents",
-        value=len(st.session_state.get('documents', []))
+        value=doc_count if doc_count is not None else len(st.session_state.get('documents', []))
     )
 
 with col2:
     st.metric(
         label="📝 Summaries",
-        value=len(st.session_state.get('summaries', []))
+        value=len(st.session_state.get('summaries_by_id', {}))
     )
 
 with col3:
     st.metric(
         label="🎯 Quizzes Taken",
-        value=len(st.session_state.get('quiz_history', []))
+        value=st.session_state.quiz_stats['count']
     )
 
 with col4:
-    avg_score = 0
-    if st.session_state.get('quiz_history'):
-        scores = [q.get('score', 0) for q in st.session_state.quiz_history]
-        avg_score = sum(scores) / len(scores)
+    avg_score = average_quiz_score()
     st.metric(
         label="📈 Avg Score",
         value=f"{avg_score:.1f}%"
@@ -83,7 +89,8 @@ with col4:
 # Recent activity
 st.subheader("📅 Recent Activity")
 if st.session_state.get('activity_log'):
-    for activity in st.session_state.activity_log[-5:]:
+    recent_activities = list(islice(reversed(st.session_state.activity_log), 5))
+    for activity in reversed(recent_activities):
         st.info(f"**{activity['timestamp']}** - {activity['action']}")
 else:
     st.info("No recent activity. Start by uploading a document!")
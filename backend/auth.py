@@ -4,8 +4,10 @@ import os
 from typing import Optional
 
 def hash_key(api_key: str) -> str:
-    """Hash API key for secure storage"""
-    return hashlib.sha256(api_key.encode()).hexdigest()
+    """Hash API key into an opaque user identifier (not a credential hash)"""
+    # usedforsecurity=False marks the digest as a non-security identifier (it only relaxes FIPS/policy
+    # checks, not speed); the digest is unchanged, so user ids derived from it stay the same
+    return hashlib.sha256(api_key.encode(), usedforsecurity=False).hexdigest()
 
 def check_authentication() -> bool:
     """Check if user is authenticated with valid API key"""
@@ -35,8 +37,9 @@ def authenticate_user(api_key: str) -> bool:
 def logout():
     """Log out user and clear session"""
     keys_to_remove = [
-        'authenticated', 'gemini_api_key', 'user_id', 'documents', 
-        'summaries', 'quiz_history', 'activity_log'
+        'authenticated', 'gemini_api_key', 'user_id', 'documents', 'documents_by_id',
+        'doc_options', 'doc_positions', 'doc_titles', 'total_words', 'summaries_by_id', 'summary_words',
+        'quiz_history', 'quiz_stats', 'activity_log', 'recent_activities_fmt'
     ]
     for key in keys_to_remove:
         if key in st.session_state:
@@ -0,0 +1,20 @@
+from functools import lru_cache
+
+@lru_cache(maxsize=4)
+def get_genai_client(api_key: str):
+    """Shared Gemini client per API key, so its HTTP connection pool is reused"""
+    # Imported here so loading this module doesn't pay for the SDK import
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+@lru_cache(maxsize=1)
+def get_arxiv_client():
+    """Shared Arxiv client; its built-in request delay then also applies across searches"""
+    import arxiv
+    return arxiv.Client()
+
+@lru_cache(maxsize=1)
+def get_http_client():
+    """Shared HTTP client for file downloads, keeping connections alive between requests"""
+    import httpx
+    return httpx.Client(timeout=60, follow_redirects=True)
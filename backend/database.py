@@ -1,10 +1,120 @@
 import os
+import time
+import queue
+import atexit
+import logging
+import threading
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.pool
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from contextlib import contextmanager
 from typing import List, Dict, Any, Optional
-import json
 from datetime import datetime
 import streamlit as st
+from backend import json_compat
+
+# Serialized forms of empty JSON columns, so empty writes skip serialization
+_EMPTY_OBJ = '{}'
+_EMPTY_ARR = '[]'
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers which server-side statements it has prepared"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+# Hot-path writes, prepared once per pooled connection so later calls skip parse/plan
+_PREPARED_STATEMENTS = {
+    'save_document': """
+        INSERT INTO documents (id, user_id, title, content, type, file_type, source, 
+                             authors, abstract, url, published, uploaded_at, 
+                             downloaded_at, word_count, metadata, content_hash)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16)
+        ON CONFLICT (id) DO UPDATE SET
+            title = EXCLUDED.title,
+            content = EXCLUDED.content,
+            word_count = EXCLUDED.word_count
+    """,
+    'save_summary': """
+        INSERT INTO summaries (id, user_id, document_id, document_title, summary, 
+                             style, key_concepts, created_at, word_count)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    """,
+    'save_quiz_result': """
+        INSERT INTO quiz_history (id, user_id, type, document_id, document_title,
+                                score, total_questions, correct_answers, difficulty,
+                                completed_at, quiz_data)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+    """,
+}
+
+# Shared connection pool, created on first Database() and reused by every instance
+_POOL: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+# One slot per pooled connection: getconn raises PoolError when none are free, so callers wait here instead
+_POOL_SLOTS: Optional[threading.BoundedSemaphore] = None
+_POOL_LOCK = threading.Lock()
+
+def _get_pool(db_url: str) -> psycopg2.pool.ThreadedConnectionPool:
+    """Create the process-wide connection pool on first use"""
+    global _POOL, _POOL_SLOTS
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # Keep the pool small so several workers stay under max_connections. A returned connection is
+                # closed if minconn are already idle, so minconn is how many stay warm between calls.
+                maxconn = int(os.environ.get('DB_POOL_MAX_CONN', 10))
+                _POOL_SLOTS = threading.BoundedSemaphore(maxconn)
+                _POOL = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=min(int(os.environ.get('DB_POOL_MIN_CONN', 5)), maxconn),
+                    maxconn=maxconn,
+                    dsn=db_url,
+                    connection_factory=_PooledConnection
+                )
+    return _POOL
+
+# Activity rows waiting to be written by the background logger
+_LOG_Q: "queue.Queue[tuple]" = queue.Queue(maxsize=10_000)
+_LOG_BATCH_SIZE = 200
+_LOG_FLUSH_INTERVAL = 0.5  # seconds to let events accumulate before each batch
+_LOG_THREAD: Optional[threading.Thread] = None
+
+def _drain_activity_queue(limit: int) -> list:
+    """Pop up to `limit` queued activity rows without blocking"""
+    rows = []
+    while len(rows) < limit:
+        try:
+            rows.append(_LOG_Q.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+def _activity_writer(db: 'Database'):
+    """Background loop that writes queued activity rows in batches"""
+    while True:
+        rows = [_LOG_Q.get()]
+        time.sleep(_LOG_FLUSH_INTERVAL)
+        rows.extend(_drain_activity_queue(_LOG_BATCH_SIZE - 1))
+        db.log_activities_bulk(rows)
+
+def _start_activity_writer(db: 'Database'):
+    """Start the background activity logger once per process"""
+    global _LOG_THREAD
+    if _LOG_THREAD is None:
+        with _POOL_LOCK:
+            if _LOG_THREAD is None:
+                _LOG_THREAD = threading.Thread(target=_activity_writer, args=(db,), daemon=True, name="activity-log-writer")
+                _LOG_THREAD.start()
+                atexit.register(_flush_activity_log, db)
+
+def _flush_activity_log(db: 'Database'):
+    """Write whatever is still queued (called at interpreter exit)"""
+    while True:
+        rows = _drain_activity_queue(_LOG_BATCH_SIZE)
+        if not rows:
+            break
+        db.log_activities_bulk(rows)
 
 class Database:
     """PostgreSQL database handler for DocGen"""
@@ -13,14 +123,32 @@ class Database:
         self.db_url = os.environ.get('DATABASE_URL')
         if not self.db_url:
             raise ValueError("DATABASE_URL environment variable not set")
+        self.pool = _get_pool(self.db_url)
+        self._slots = _POOL_SLOTS
+    
+    @contextmanager
+    def _conn(self):
+        """Borrow a pooled connection, waiting for one to be free; commits on success, rolls back on error"""
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                self.pool.putconn(conn)
     
-    def get_connection(self):
-        """Get database connection"""
-        return psycopg2.connect(self.db_url)
+    @staticmethod
+    def _execute_prepared(cur, name: str, params: tuple):
+        """Run a statement from _PREPARED_STATEMENTS, preparing it on first use"""
+        prepared = cur.connection.prepared
+        if name not in prepared:
+            cur.execute(f"PREPARE {name} AS {_PREPARED_STATEMENTS[name]}")
+            prepared.add(name)
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
     
     def init_schema(self):
         """Initialize database schema"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             with conn.cursor() as cur:
                 # Documents table
                 cur.execute("""
@@ -43,6 +171,9 @@ class Database:
                     )
                 """)
                 
+                # SHA-256 of the uploaded file, used to skip re-processing duplicate uploads
+                cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT")
+                
                 # Summaries table
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS summaries (
@@ -87,47 +218,82 @@ class Database:
                     )
                 """)
                 
-                # Create indexes
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_user ON documents(user_id)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_summaries_user ON summaries(user_id)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_quiz_user ON quiz_history(user_id)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_activity_user ON activity_log(user_id)")
+                # Create indexes matching each per-user "newest first" listing, so Postgres
+                # reads rows in order instead of sorting them
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded ON documents(user_id, uploaded_at DESC)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_summaries_user_created ON summaries(user_id, created_at DESC)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_quiz_user_completed ON quiz_history(user_id, completed_at DESC)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_hash ON documents(user_id, content_hash)")
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_activity_user_ts
+                    ON activity_log(user_id, timestamp DESC) INCLUDE (action, metadata)
+                """)
+                
+                # Single-column user_id indexes are covered by the composite ones above
+                cur.execute("DROP INDEX IF EXISTS idx_documents_user")
+                cur.execute("DROP INDEX IF EXISTS idx_summaries_user")
+                cur.execute("DROP INDEX IF EXISTS idx_quiz_user")
+                cur.execute("DROP INDEX IF EXISTS idx_activity_user")
                 
                 conn.commit()
     
     # Document operations
+    @staticmethod
+    def _document_row(user_id: str, document: Dict[str, Any]) -> tuple:
+        """Build the documents table row for a document dict"""
+        return (
+            document['id'], user_id, document['title'], document['content'],
+            document['type'], document.get('file_type'), document['source'],
+            json_compat.dumps(document['authors']) if document.get('authors') else _EMPTY_ARR,
+            document.get('abstract'),
+            document.get('url'), document.get('published'),
+            document.get('uploaded_at'), document.get('downloaded_at'),
+            document.get('word_count'),
+            json_compat.dumps(document['metadata']) if document.get('metadata') else _EMPTY_OBJ,
+            document.get('content_hash')
+        )
+    
     def save_document(self, user_id: str, document: Dict[str, Any]) -> bool:
         """Save a document to the database"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
+                    self._execute_prepared(cur, 'save_document', self._document_row(user_id, document))
+                    conn.commit()
+            _invalidate_document_cache()
+            return True
+        except Exception as e:
+            st.error(f"Error saving document: {e}")
+            return False
+    
+    def save_documents_bulk(self, user_id: str, documents: List[Dict[str, Any]]) -> bool:
+        """Save many documents in one round-trip and one commit"""
+        if not documents:
+            return True
+        try:
+            with self._conn() as conn:
+                with conn.cursor() as cur:
+                    execute_values(cur, """
                         INSERT INTO documents (id, user_id, title, content, type, file_type, source, 
                                              authors, abstract, url, published, uploaded_at, 
-                                             downloaded_at, word_count, metadata)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                             downloaded_at, word_count, metadata, content_hash)
+                        VALUES %s
                         ON CONFLICT (id) DO UPDATE SET
                             title = EXCLUDED.title,
                             content = EXCLUDED.content,
                             word_count = EXCLUDED.word_count
-                    """, (
-                        document['id'], user_id, document['title'], document['content'],
-                        document['type'], document.get('file_type'), document['source'],
-                        json.dumps(document.get('authors', [])), document.get('abstract'),
-                        document.get('url'), document.get('published'),
-                        document.get('uploaded_at'), document.get('downloaded_at'),
-                        document.get('word_count'), json.dumps(document.get('metadata', {}))
-                    ))
+                    """, [self._document_row(user_id, doc) for doc in documents], page_size=200)
                     conn.commit()
+            _invalidate_document_cache()
             return True
         except Exception as e:
-            st.error(f"Error saving document: {e}")
+            st.error(f"Error saving documents: {e}")
             return False
     
     def get_documents(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all documents for a user"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("SELECT * FROM documents WHERE user_id = %s ORDER BY uploaded_at DESC", (user_id,))
                     docs = cur.fetchall()
@@ -146,35 +312,96 @@ class Database:
             st.error(f"Error loading documents: {e}")
             return []
     
+    def get_documents_by_hash(self, user_id: str, content_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Map each content hash the user already has a document for to that document"""
+        if not content_hashes:
+            return {}
+        try:
+            with self._conn() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(
+                        "SELECT * FROM documents WHERE user_id = %s AND content_hash = ANY(%s)",
+                        (user_id, list(content_hashes))
+                    )
+                    return {doc['content_hash']: dict(doc) for doc in cur.fetchall()}
+        except Exception as e:
+            st.error(f"Error looking up documents: {e}")
+            return {}
+    
+    def count_documents(self, user_id: str) -> Optional[int]:
+        """Count a user's documents without loading them"""
+        try:
+            with self._conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COUNT(*) FROM documents WHERE user_id = %s", (user_id,))
+                    return cur.fetchone()[0]
+        except Exception as e:
+            st.error(f"Error counting documents: {e}")
+            return None
+    
+    def list_document_headers(self, user_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get one page of document headers (no content) for a user"""
+        try:
+            with self._conn() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT id, title, type, source, uploaded_at, downloaded_at, word_count
+                        FROM documents
+                        WHERE user_id = %s
+                        ORDER BY uploaded_at DESC
+                        LIMIT %s OFFSET %s
+                    """, (user_id, limit, offset))
+                    return [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            st.error(f"Error loading documents: {e}")
+            return []
+    
+    def get_document(self, user_id: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single document, including its content"""
+        try:
+            with self._conn() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("SELECT * FROM documents WHERE id = %s AND user_id = %s", (doc_id, user_id))
+                    doc = cur.fetchone()
+                    return dict(doc) if doc else None
+        except Exception as e:
+            st.error(f"Error loading document: {e}")
+            return None
+    
     def delete_document(self, user_id: str, doc_id: str) -> bool:
         """Delete a document"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
                     cur.execute("DELETE FROM documents WHERE id = %s AND user_id = %s", (doc_id, user_id))
                     conn.commit()
+            _invalidate_document_cache()
+            # Summaries of the document are removed by ON DELETE CASCADE
+            cached_summaries.clear()
             return True
         except Exception as e:
             st.error(f"Error deleting document: {e}")
             return False
     
     # Summary operations
+    @staticmethod
+    def _summary_row(user_id: str, summary: Dict[str, Any]) -> tuple:
+        """Parameters for the save_summary statement"""
+        return (
+            summary['id'], user_id, summary['document_id'], summary['document_title'],
+            summary['summary'], summary.get('style'), 
+            json_compat.dumps(summary['key_concepts']) if summary.get('key_concepts') else _EMPTY_ARR,
+            summary.get('created_at'), summary.get('word_count')
+        )
+    
     def save_summary(self, user_id: str, summary: Dict[str, Any]) -> bool:
         """Save a summary to the database"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO summaries (id, user_id, document_id, document_title, summary, 
-                                             style, key_concepts, created_at, word_count)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        summary['id'], user_id, summary['document_id'], summary['document_title'],
-                        summary['summary'], summary.get('style'), 
-                        json.dumps(summary.get('key_concepts', [])),
-                        summary.get('created_at'), summary.get('word_count')
-                    ))
+                    self._execute_prepared(cur, 'save_summary', self._summary_row(user_id, summary))
                     conn.commit()
+            cached_summaries.clear()
             return True
         except Exception as e:
             st.error(f"Error saving summary: {e}")
@@ -183,7 +410,7 @@ class Database:
     def get_summaries(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all summaries for a user"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("SELECT * FROM summaries WHERE user_id = %s ORDER BY created_at DESC", (user_id,))
                     summaries = cur.fetchall()
@@ -202,33 +429,53 @@ class Database:
     def delete_summary(self, user_id: str, summary_id: str) -> bool:
         """Delete a summary"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
                     cur.execute("DELETE FROM summaries WHERE id = %s AND user_id = %s", (summary_id, user_id))
                     conn.commit()
+            cached_summaries.clear()
             return True
         except Exception as e:
             st.error(f"Error deleting summary: {e}")
             return False
     
+    def apply_summary_writes(self, ops: List[tuple]) -> bool:
+        """Apply queued (op, user_id, payload) summary and quiz result writes, in order, in one transaction"""
+        try:
+            with self._conn() as conn:
+                with conn.cursor() as cur:
+                    for op, user_id, payload in ops:
+                        if op == 'save_summary':
+                            self._execute_prepared(cur, 'save_summary', self._summary_row(user_id, payload))
+                        elif op == 'save_quiz_result':
+                            self._execute_prepared(cur, 'save_quiz_result', self._quiz_row(user_id, payload))
+                        else:
+                            cur.execute("DELETE FROM summaries WHERE id = %s AND user_id = %s", (payload, user_id))
+                    conn.commit()
+            cached_summaries.clear()
+            return True
+        except Exception as e:
+            logging.error(f"Summary write failed: {e}")
+            return False
+    
     # Quiz history operations
+    @staticmethod
+    def _quiz_row(user_id: str, quiz_result: Dict[str, Any]) -> tuple:
+        """Parameters for the save_quiz_result statement"""
+        return (
+            quiz_result['id'], user_id, quiz_result['type'], quiz_result['document_id'],
+            quiz_result['document_title'], quiz_result.get('score'),
+            quiz_result.get('total_questions'), quiz_result.get('correct_answers'),
+            quiz_result.get('difficulty'), quiz_result.get('completed_at'),
+            json_compat.dumps(quiz_result)
+        )
+    
     def save_quiz_result(self, user_id: str, quiz_result: Dict[str, Any]) -> bool:
         """Save quiz result to database"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO quiz_history (id, user_id, type, document_id, document_title,
-                                                score, total_questions, correct_answers, difficulty,
-                                                completed_at, quiz_data)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        quiz_result['id'], user_id, quiz_result['type'], quiz_result['document_id'],
-                        quiz_result['document_title'], quiz_result.get('score'),
-                        quiz_result.get('total_questions'), quiz_result.get('correct_answers'),
-                        quiz_result.get('difficulty'), quiz_result.get('completed_at'),
-                        json.dumps(quiz_result)
-                    ))
+                    self._execute_prepared(cur, 'save_quiz_result', self._quiz_row(user_id, quiz_result))
                     conn.commit()
             return True
         except Exception as e:
@@ -238,7 +485,7 @@ class Database:
     def get_quiz_history(self, user_id: str) -> List[Dict[str, Any]]:
         """Get quiz history for a user"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("SELECT * FROM quiz_history WHERE user_id = %s ORDER BY completed_at DESC", (user_id,))
                     quizzes = cur.fetchall()
@@ -256,23 +503,43 @@ class Database:
     
     # Activity log operations
     def log_activity(self, user_id: str, action: str, metadata: Dict[str, Any] = None) -> bool:
-        """Log user activity"""
+        """Queue a user activity; a background thread writes it in batches"""
+        _start_activity_writer(self)
         try:
-            with self.get_connection() as conn:
+            _LOG_Q.put_nowait((user_id, action, json_compat.dumps(metadata) if metadata else _EMPTY_OBJ))
+            return True
+        except queue.Full:
+            return False
+    
+    def log_activities(self, user_id: str, actions: List[str]) -> bool:
+        """Queue several activities for the background writer; False if the queue overflowed"""
+        _start_activity_writer(self)
+        try:
+            for action in actions:
+                _LOG_Q.put_nowait((user_id, action, _EMPTY_OBJ))
+            return True
+        except queue.Full:
+            return False
+    
+    def log_activities_bulk(self, rows: List[tuple]) -> bool:
+        """Insert (user_id, action, metadata_json) rows in one round-trip"""
+        try:
+            with self._conn() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("""
+                    execute_values(cur, """
                         INSERT INTO activity_log (user_id, action, metadata)
-                        VALUES (%s, %s, %s)
-                    """, (user_id, action, json.dumps(metadata or {})))
+                        VALUES %s
+                    """, rows, page_size=_LOG_BATCH_SIZE)
                     conn.commit()
             return True
         except Exception as e:
+            logging.error(f"Activity log write failed: {e}")
             return False
     
     def get_activity_log(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get activity log for a user"""
         try:
-            with self.get_connection() as conn:
+            with self._conn() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("""
                         SELECT * FROM activity_log 
@@ -291,3 +558,90 @@ class Database:
         except Exception as e:
             st.error(f"Error loading activity log: {e}")
             return []
+
+@st.cache_resource(show_spinner=False)
+def get_db() -> Database:
+    """Process-wide Database handle; it is thread-safe since every call borrows from the pool"""
+    return Database()
+
+class SummaryWriter:
+    """Write-behind queue for summary and quiz result writes, applied by a background thread in batched transactions"""
+    
+    OPS = ('save_summary', 'delete_summary', 'save_quiz_result')
+    
+    def __init__(self, db: Database, batch_size: int = 32, flush_interval: float = 0.1):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._q: "queue.Queue[tuple]" = queue.Queue(maxsize=10_000)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="summary-writer")
+        self._thread.start()
+        atexit.register(self.flush)
+    
+    def enqueue(self, op: tuple) -> bool:
+        """Queue ('save_summary' | 'save_quiz_result', user_id, record) or ('delete_summary', user_id, id); False if full"""
+        if op[0] not in self.OPS:
+            raise ValueError(f"Unknown queued write: {op[0]}")
+        try:
+            self._q.put_nowait(op)
+            return True
+        except queue.Full:
+            return False
+    
+    def _drain(self, limit: int) -> list:
+        """Pop up to `limit` queued ops without blocking"""
+        ops = []
+        while len(ops) < limit:
+            try:
+                ops.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return ops
+    
+    def _apply(self, ops: list):
+        """Write a batch; if the transaction fails, retry op by op so one bad row doesn't drop the rest"""
+        if not self.db.apply_summary_writes(ops) and len(ops) > 1:
+            for op in ops:
+                self.db.apply_summary_writes([op])
+    
+    def _run(self):
+        """Background loop: wait for an op, let more accumulate briefly, then write them together"""
+        while True:
+            ops = [self._q.get()]
+            time.sleep(self.flush_interval)
+            ops.extend(self._drain(self.batch_size - 1))
+            self._apply(ops)
+    
+    def flush(self):
+        """Write whatever is still queued (called at interpreter exit)"""
+        while True:
+            ops = self._drain(self.batch_size)
+            if not ops:
+                break
+            self._apply(ops)
+
+@st.cache_resource(show_spinner=False)
+def get_writer() -> SummaryWriter:
+    """Process-wide writer for summaries and quiz results, sharing the pooled Database handle"""
+    return SummaryWriter(get_db())
+
+# Read-through caches for per-user listings that pages request on every rerun
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_documents(user_id: str) -> List[Dict[str, Any]]:
+    """Documents for a user, cached for up to a minute"""
+    return get_db().get_documents(user_id)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_document_count(user_id: str) -> Optional[int]:
+    """Document count for a user, cached for up to a minute"""
+    return get_db().count_documents(user_id)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_summaries(user_id: str) -> List[Dict[str, Any]]:
+    """Summaries for a user, cached for up to a minute"""
+    return get_db().get_summaries(user_id)
+
+def _invalidate_document_cache():
+    """Drop cached document reads after a write"""
+    cached_documents.clear()
+    cached_document_count.clear()
@@ -0,0 +1,67 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+class LRUEmbeddingCache:
+    """Thread-safe LRU cache of embedding vectors keyed by a hash of the input text"""
+    
+    def __init__(self, capacity: int = 1024, ttl: float = 3600):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(text: str) -> str:
+        """Fixed-size key so long texts don't stay alive as dict keys"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def get(self, text: str) -> Optional[Any]:
+        """Return the cached vector for text, or None if missing or expired"""
+        key = self._key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, text: str, vector: Any):
+        """Store a vector, evicting the least recently used entry when full"""
+        key = self._key(text)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+    
+    def get_or_compute(self, text: str, compute: Callable[[str], Any]) -> Any:
+        """Return the cached vector for text, computing and storing it on a miss"""
+        vector = self.get(text)
+        if vector is None:
+            vector = compute(text)
+            self.put(text, vector)
+        return vector
+    
+    def warmup(self, texts: List[str], compute_many: Callable[[List[str]], List[Any]]):
+        """Pre-populate the cache, computing all missing entries in one call"""
+        missing = [text for text in dict.fromkeys(texts) if self.get(text) is None]
+        if missing:
+            for text, vector in zip(missing, compute_many(missing)):
+                self.put(text, vector)
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,95 +1,292 @@
 import os
-import pickle
-import numpy as np
-from typing import List, Dict, Any, Optional
+import re
+import heapq
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional
 import streamlit as st
-from google import genai
-from google.genai import types
+from backend import json_compat
+from backend.clients import get_genai_client
+from backend.embed_cache import LRUEmbeddingCache
+
+_WORD_RE = re.compile(r'\S+')
+_EMBED_MODEL = "text-embedding-004"
+_EMBED_BATCH_SIZE = 100  # Max texts per embed_content request
+_EMBED_WORKERS = 4
+_COMPACT_RATIO = 0.1  # Compact once this fraction of chunks are tombstoned
+_QUANTIZE_BATCH = 4096  # Rows are moved from the float32 index into the compressed index in batches this size
+_IVF_THRESHOLD = 10_000  # From this many compressed rows, switch from 8-bit scalar quantization to IVF+PQ
+_IVF_NPROBE = 8
+_RESCORE_FACTOR = 4  # Candidates fetched from the compressed index per result, then rescored exactly
+# Set VECTOR_QUANTIZE=0 to keep all vectors in exact float32 indexes
+_QUANTIZE_DEFAULT = os.environ.get("VECTOR_QUANTIZE", "1") != "0"
+_SNAPSHOT_EVERY = 200  # Fold the append-only log into a fresh snapshot after this many operations
+
+# Query vectors shared across sessions, so repeated and paginated searches skip the API
+_QUERY_CACHE = LRUEmbeddingCache(capacity=1024, ttl=3600)
+
+# Trains IVF+PQ indexes off the request path; one at a time is plenty
+_TRAINER = ThreadPoolExecutor(max_workers=1)
 
 class DocumentEmbeddings:
     """FAISS-based vector storage for document embeddings using Gemini embeddings"""
     
-    def __init__(self):
+    def __init__(self, quantize: bool = _QUANTIZE_DEFAULT):
         api_key = st.session_state.get('gemini_api_key') or os.environ.get("GEMINI_API_KEY", "")
         if api_key:
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_genai_client(api_key)
         else:
             self.client = None
         self.dimension = 768  # Gemini embedding dimension
         self.documents = []
-        self.metadata = []
-        self.index_file = "data/embeddings_index.pkl"
+        # Chunk metadata as parallel lists; document-level fields are stored once in doc_meta
+        self.doc_ids = []
+        self.chunk_ids = []
+        self.doc_meta = {}  # document_id -> metadata passed to add_document
+        self._by_doc = {}  # document_id -> chunk positions
+        self._postings = None  # lowercase word -> chunk positions, built on first keyword search
+        self._deleted = set()  # positions of removed chunks awaiting compaction
+        # Unit-length chunk vectors; row i belongs to self.documents[i] and only a prefix may be embedded
+        self.embeddings = None
+        # Rows [0, n_compressed) are searched through a compressed index (8-bit scalar quantization,
+        # or IVF256,PQ16 once large enough), the rest exactly. Both indexes use row positions as
+        # FAISS ids, so removed chunks are taken out with remove_ids.
+        self._compressed_index = None
+        self._flat_index = None
+        self._n_compressed = 0
+        # With quantize=False every row stays in the exact float32 index
+        self.quantize = quantize
+        self._training = None  # Future of an IVF+PQ index being trained in the background
+        # Persistence is a snapshot (chunk JSON + .npy matrix) plus append-only logs of later
+        # operations and vectors; files are tagged with the snapshot generation they extend
+        self._generation = 0
+        self._log_ops = 0
+        self.index_file = "data/embeddings_index.json"
+        self.log_file = "data/embeddings_log.jsonl"
+        self.legacy_vectors_file = "data/embeddings.npy"
+        self.legacy_index_file = "data/embeddings_index.pkl"
         self.load_index()
     
+    def has_document(self, document_id: str) -> bool:
+        """Whether a document's chunks are in the store"""
+        return document_id in self._by_doc
+    
     def add_document(self, text: str, metadata: Dict[str, Any]):
         """Add a document to the vector store"""
+        return self.add_documents([text], [metadata])
+    
+    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Add several documents, embedding all of their chunks in one batch"""
         try:
             if not self.client:
                 st.warning("Embeddings not available. Search functionality will be limited.")
                 return False
-                
-            # Split text into chunks
-            chunks = self._chunk_text(text, chunk_size=512, overlap=50)
             
-            for i, chunk in enumerate(chunks):
-                # Store document and metadata
-                self.documents.append(chunk)
-                chunk_metadata = metadata.copy()
-                chunk_metadata['chunk_id'] = i
-                chunk_metadata['chunk_text'] = chunk
-                self.metadata.append(chunk_metadata)
+            for text, metadata in zip(texts, metadatas):
+                # Split text into chunks
+                chunks = self._chunk_text(text, chunk_size=512, overlap=50)
+                
+                # Store the chunks and append only this document to the log
+                self._append_chunks(metadata, chunks)
+                self._append_log({'op': 'add', 'metadata': metadata, 'chunks': chunks})
             
-            self.save_index()
+            # Embed every new chunk (and any left over from earlier failures) together
+            self._ensure_vectors()
+            self._maybe_snapshot()
             return True
         except Exception as e:
             st.error(f"Error adding document to embeddings: {e}")
             return False
     
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents using keyword matching"""
+    def _append_chunks(self, metadata: Dict[str, Any], chunks: List[str]):
+        """Add a document's chunks to the in-memory store"""
+        document_id = metadata.get('document_id')
+        start = len(self.documents)
+        self._by_doc.setdefault(document_id, []).extend(range(start, start + len(chunks)))
+        self.doc_meta[document_id] = dict(metadata)
+        self.documents.extend(chunks)
+        self.doc_ids.extend([document_id] * len(chunks))
+        self.chunk_ids.extend(range(len(chunks)))
+        if self._postings is not None:
+            # Tokenize new chunks at ingest rather than rebuilding the whole index at query time
+            self._index_words(start)
+    
+    def search(self, query: str, k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for similar chunks by cosine similarity, falling back to keyword matching"""
         try:
             if not self.documents:
                 return []
             
-            # Simple keyword-based search as fallback
-            query_lower = query.lower()
-            query_words = set(query_lower.split())
+            # filter limits results to documents whose metadata has all the given values, e.g. {'document_id': doc_id}
+            rows = self._filter_rows(filter) if filter else None
+            if rows is not None and not rows:
+                return []
             
-            results = []
-            for i, (doc, meta) in enumerate(zip(self.documents, self.metadata)):
-                doc_lower = doc.lower()
-                doc_words = set(doc_lower.split())
-                
-                # Calculate simple similarity score based on word overlap
-                common_words = query_words.intersection(doc_words)
-                if common_words:
-                    score = len(common_words) / max(len(query_words), 1)
-                    result = meta.copy()
-                    result['similarity_score'] = float(score)
-                    result['text'] = doc
-                    results.append(result)
+            if self._ensure_vectors():
+                try:
+                    if rows is not None:
+                        return self._scoped_vector_search(query, k, rows)
+                    return self._vector_search(query, k)
+                except Exception as e:
+                    st.warning(f"Semantic search unavailable, using keyword search: {e}")
             
-            # Sort by score and return top k
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
-            return results[:k]
+            return self._keyword_search(query, k, rows)
         except Exception as e:
             st.error(f"Error searching embeddings: {e}")
             return []
     
-    def get_similar_chunks(self, document_id: str, k: int = 3) -> List[str]:
-        """Get similar chunks from the same document"""
+    def _vector_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """Top-k chunks by inner product of normalized Gemini embeddings"""
+        query_vector = _QUERY_CACHE.get_or_compute(query, self._embed_query)
+        self._adopt_trained_index()
+        # Removed chunks are no longer in either index, so every hit is live
+        hits = []
+        index = self._compressed_index
+        if index is not None and index.ntotal:
+            # Compressed scores are approximate (PQ can even miss exact matches), so over-fetch and rescore
+            # the candidates against their float32 rows before ranking them with the exact tier
+            _, indices = index.search(query_vector, min(k * _RESCORE_FACTOR, index.ntotal))
+            # FAISS pads missing results with -1
+            candidates = indices[0][indices[0] >= 0]
+            hits.extend(zip(candidates.tolist(), (self.embeddings[candidates] @ query_vector[0]).tolist()))
+        index = self._flat_index
+        if index is not None and index.ntotal:
+            scores, indices = index.search(query_vector, min(k, index.ntotal))
+            valid = indices[0] >= 0
+            hits.extend(zip(indices[0][valid].tolist(), scores[0][valid].tolist()))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return [self._chunk_result(i, score) for i, score in hits[:k]]
+    
+    def _filter_rows(self, filter: Dict[str, Any]) -> List[int]:
+        """Live chunk positions of the documents matching every key in filter"""
+        if 'document_id' in filter:
+            document_ids = [filter['document_id']] if filter['document_id'] in self._by_doc else []
+        else:
+            document_ids = self._by_doc.keys()
+        
+        rows = []
+        for document_id in document_ids:
+            meta = self.doc_meta.get(document_id, {})
+            if all(meta.get(key) == value for key, value in filter.items() if key != 'document_id'):
+                rows.extend(self._by_doc[document_id])
+        return rows
+    
+    def _scoped_vector_search(self, query: str, k: int, rows: List[int]) -> List[Dict[str, Any]]:
+        """Top-k chunks among rows, scored exactly against their stored vectors"""
+        import numpy as np
+        
+        query_vector = _QUERY_CACHE.get_or_compute(query, self._embed_query)
+        # A filter usually selects a few documents, so scoring their rows directly beats over-fetching from the index
+        positions = np.asarray(rows, dtype=np.int64)
+        scores = self.embeddings[positions] @ query_vector[0]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [self._chunk_result(int(positions[j]), float(scores[j])) for j in top]
+    
+    def rank_documents(self, query: str, k: int = 10, document_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """Ids of the k documents (among document_ids, if given) whose best chunk is most similar to query"""
         try:
-            # Find all chunks from the document
-            doc_chunks = []
-            for i, meta in enumerate(self.metadata):
-                if meta.get('document_id') == document_id:
-                    doc_chunks.append((i, self.documents[i]))
-            
-            if not doc_chunks:
+            if document_ids is None:
+                document_ids = list(self._by_doc)
+            else:
+                document_ids = [document_id for document_id in document_ids if document_id in self._by_doc]
+            if not document_ids:
                 return []
             
+            if self._ensure_vectors():
+                try:
+                    import numpy as np
+                    
+                    query_vector = _QUERY_CACHE.get_or_compute(query, self._embed_query)
+                    rows = [self._by_doc[document_id] for document_id in document_ids]
+                    # Score every live chunk in one product, then take each document's best chunk
+                    positions = np.fromiter((i for doc_rows in rows for i in doc_rows), dtype=np.int64)
+                    starts = np.cumsum([0] + [len(doc_rows) for doc_rows in rows[:-1]])
+                    scores = np.maximum.reduceat(self.embeddings[positions] @ query_vector[0], starts)
+                    top = np.argsort(-scores, kind='stable')[:k]
+                    return [document_ids[j] for j in top]
+                except Exception as e:
+                    st.warning(f"Semantic search unavailable, using keyword search: {e}")
+            
+            ranked = []
+            rows = [i for document_id in document_ids for i in self._by_doc[document_id]]
+            for result in self._keyword_search(query, len(rows), rows):
+                if result['document_id'] not in ranked:
+                    ranked.append(result['document_id'])
+                    if len(ranked) == k:
+                        break
+            return ranked
+        except Exception as e:
+            st.error(f"Error ranking documents: {e}")
+            return []
+    
+    def _embed_query(self, query: str):
+        """Embed a single search query as a (1, dimension) array"""
+        return self._embed([query], "RETRIEVAL_QUERY")
+    
+    def warmup(self, queries: List[str]):
+        """Embed common queries ahead of time so their first search skips the API"""
+        if not self.client or not queries:
+            return
+        try:
+            _QUERY_CACHE.warmup(
+                queries,
+                lambda texts: [row[None, :] for row in self._embed(texts, "RETRIEVAL_QUERY")]
+            )
+        except Exception as e:
+            st.warning(f"Could not warm up query embeddings: {e}")
+    
+    def _keyword_search(self, query: str, k: int, rows: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents using keyword matching, optionally only among rows"""
+        if self._postings is None:
+            self._build_postings()
+        
+        # Count, per chunk, how many distinct query words it contains by walking only their postings
+        query_words = set(query.lower().split())
+        n_query = max(len(query_words), 1)
+        counts = Counter()
+        for word in query_words:
+            counts.update(self._postings.get(word, ()))
+        for i in self._deleted.intersection(counts):
+            del counts[i]
+        if rows is not None:
+            allowed = set(rows)
+            counts = Counter({i: common for i, common in counts.items() if i in allowed})
+        
+        # Highest overlap first, earlier chunks first on ties
+        top = heapq.nlargest(k, counts.items(), key=lambda x: (x[1], -x[0]))
+        return [self._chunk_result(i, common / n_query) for i, common in top]
+    
+    def _chunk_result(self, i: int, score: float) -> Dict[str, Any]:
+        """Search result for chunk i: its document's metadata plus chunk fields"""
+        return {
+            **self.doc_meta.get(self.doc_ids[i], {}),
+            'chunk_id': self.chunk_ids[i],
+            'similarity_score': score,
+            'text': self.documents[i]
+        }
+    
+    def _build_postings(self):
+        """Index every chunk under each distinct lowercase word it contains"""
+        self._postings = {}
+        self._index_words(0)
+    
+    def _index_words(self, start: int):
+        """Add chunks from position start onwards to the keyword postings"""
+        postings = self._postings
+        for i in range(start, len(self.documents)):
+            for word in set(self.documents[i].lower().split()):
+                postings.setdefault(word, []).append(i)
+    
+    def get_similar_chunks(self, document_id: str, k: int = 3) -> List[str]:
+        """Get similar chunks from the same document"""
+        try:
             # Return first k chunks or all if less than k
-            return [chunk[1] for chunk in doc_chunks[:k]]
+            return [self.documents[i] for i in self._by_doc.get(document_id, [])[:k]]
         except Exception as e:
             st.error(f"Error getting similar chunks: {e}")
             return []
@@ -97,73 +294,458 @@ class DocumentEmbeddings:
     def remove_document(self, document_id: str):
         """Remove a document from the vector store"""
         try:
-            # Find indices to remove
-            indices_to_remove = []
-            for i, meta in enumerate(self.metadata):
-                if meta.get('document_id') == document_id:
-                    indices_to_remove.append(i)
-            
-            # Remove from metadata and documents (reverse order to maintain indices)
-            for idx in reversed(indices_to_remove):
-                del self.metadata[idx]
-                del self.documents[idx]
+            if not self._tombstone(document_id):
+                return True
             
-            # Rebuild FAISS index
-            self._rebuild_index()
-            self.save_index()
+            # Only rewrite the store once enough tombstones have piled up
+            if len(self._deleted) > _COMPACT_RATIO * len(self.documents):
+                self._compact()
+                self.save_index()
+            else:
+                self._append_log({'op': 'remove', 'document_id': document_id})
+                self._maybe_snapshot()
             return True
         except Exception as e:
             st.error(f"Error removing document: {e}")
             return False
     
+    def _tombstone(self, document_id: str) -> bool:
+        """Mark a document's chunks as deleted; False if it isn't in the store"""
+        positions = self._by_doc.pop(document_id, None)
+        if not positions:
+            return False
+        self.doc_meta.pop(document_id, None)
+        self._deleted.update(positions)
+        self._unindex(positions)
+        return True
+    
+    def _unindex(self, positions: Iterable[int]):
+        """Remove rows from the FAISS indexes without rebuilding them"""
+        import numpy as np
+        import faiss
+        
+        selector = faiss.IDSelectorBatch(np.fromiter(positions, dtype=np.int64))
+        for index in (self._compressed_index, self._flat_index):
+            if index is not None and index.ntotal:
+                index.remove_ids(selector)
+    
+    def _compact(self):
+        """Drop tombstoned chunks and their vectors in one pass and renumber the index"""
+        import numpy as np
+        
+        keep = np.ones(len(self.documents), dtype=bool)
+        keep[list(self._deleted)] = False
+        n_embedded = len(self.embeddings)
+        
+        self.documents = [doc for doc, kept in zip(self.documents, keep) if kept]
+        self.doc_ids = [doc_id for doc_id, kept in zip(self.doc_ids, keep) if kept]
+        self.chunk_ids = [chunk_id for chunk_id, kept in zip(self.chunk_ids, keep) if kept]
+        self._deleted = set()
+        self._rebuild_doc_map()
+        self._postings = None
+        # Positions shift, so the rows are re-added under their new ids; the compressed
+        # index keeps its training and only has to encode them again
+        compressed_index = self._compressed_index
+        if compressed_index is not None:
+            compressed_index.reset()
+        self._set_vectors(self.embeddings[keep[:n_embedded]], compressed_index)
+    
     def _chunk_text(self, text: str, chunk_size: int = 512, overlap: int = 50) -> List[str]:
         """Split text into overlapping chunks"""
-        words = text.split()
-        chunks = []
+        # Locate word boundaries once and slice the original text, instead of re-joining word lists.
+        # Offsets are packed flat (start, end, start, end, ...) so no per-word objects are kept.
+        offsets = array('q')
+        for match in _WORD_RE.finditer(text):
+            offsets.extend(match.span())
+        n_words = len(offsets) // 2
         
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            if chunk.strip():
-                chunks.append(chunk)
+        chunks = [
+            text[offsets[2 * i]:offsets[2 * min(i + chunk_size, n_words) - 1]]
+            for i in range(0, n_words, chunk_size - overlap)
+        ]
         
         return chunks if chunks else [text]
     
-    def _rebuild_index(self):
-        """Rebuild the index from current documents"""
-        pass
+    def _embed(self, texts: List[str], task_type: str):
+        """Embed texts in as few requests as possible and L2-normalize them so inner product is cosine similarity"""
+        import numpy as np
+        import faiss
+        from google.genai import types
+        
+        config = types.EmbedContentConfig(task_type=task_type)
+        
+        def embed_batch(batch: List[str]) -> List[List[float]]:
+            response = self.client.models.embed_content(model=_EMBED_MODEL, contents=batch, config=config)
+            return [e.values for e in response.embeddings]
+        
+        if len(texts) <= _EMBED_BATCH_SIZE:
+            values = embed_batch(texts)
+        else:
+            # Over the per-request limit: send sub-batches concurrently, keeping their order
+            batches = [texts[i:i + _EMBED_BATCH_SIZE] for i in range(0, len(texts), _EMBED_BATCH_SIZE)]
+            with ThreadPoolExecutor(max_workers=_EMBED_WORKERS) as executor:
+                values = [v for batch_values in executor.map(embed_batch, batches) for v in batch_values]
+        
+        vectors = np.asarray(values, dtype=np.float32)
+        if vectors.shape != (len(texts), self.dimension):
+            raise ValueError(f"Unexpected embedding shape {vectors.shape}")
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    def _set_vectors(self, vectors, compressed_index=None, n_compressed: int = 0):
+        """Replace the embedding matrix and rebuild the FAISS indexes over it"""
+        import numpy as np
+        
+        self.embeddings = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        # A trained compressed index already holding rows [0, n_compressed) skips retraining
+        self._compressed_index = compressed_index
+        self._n_compressed = n_compressed if compressed_index is not None else 0
+        self._flat_index = None
+        if compressed_index is not None and compressed_index.ntotal and self._deleted:
+            # Saved before later removals were logged
+            self._unindex(self._deleted)
+        self._index_rows(self._n_compressed)
+    
+    def _new_compressed_index(self, n_rows: int):
+        """Untrained compressed index suited to n_rows vectors"""
+        import faiss
+        
+        if n_rows >= _IVF_THRESHOLD:
+            # IVF indexes store ids natively
+            index = faiss.index_factory(self.dimension, "IVF256,PQ16", faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = _IVF_NPROBE
+            return index
+        return faiss.IndexIDMap2(
+            faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        )
+    
+    def _index_rows(self, start: int):
+        """Add embedding rows from start onwards, compressing whole batches"""
+        import faiss
+        
+        n_total = len(self.embeddings)
+        n_target = n_total - n_total % _QUANTIZE_BATCH if self.quantize else 0
+        
+        self._adopt_trained_index()
+        if n_target > self._n_compressed:
+            if self._compressed_index is None:
+                # Train once on everything compressed so far; 8-bit quantizer ranges take a single quick
+                # pass. Later batches are only added; vectors are unit length throughout.
+                self._compressed_index = self._new_compressed_index(0)
+                self._compressed_index.train(self.embeddings[:n_target])
+                self._n_compressed = 0
+            if n_target >= _IVF_THRESHOLD and not isinstance(self._compressed_index, faiss.IndexIVF):
+                # Training IVF+PQ centroids and codebooks takes tens of seconds, so it happens in the
+                # background while the 8-bit index keeps serving (and growing) until it is swapped in
+                self._train_in_background(n_target)
+            self._add_rows(self._compressed_index, self._n_compressed, n_target)
+            self._n_compressed = n_target
+            # Rows that moved into the quantized index leave the exact one
+            self._flat_index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            self._add_rows(self._flat_index, n_target, n_total)
+        else:
+            if self._flat_index is None:
+                self._flat_index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            self._add_rows(self._flat_index, start, n_total)
+    
+    def _train_in_background(self, n_rows: int):
+        """Start training an IVF+PQ index on the first n_rows vectors, unless one is already training"""
+        if self._training is not None:
+            return
+        sample = self.embeddings[:n_rows].copy()
+        
+        def train():
+            index = self._new_compressed_index(n_rows)
+            index.train(sample)
+            return index
+        
+        self._training = _TRAINER.submit(train)
+    
+    def _adopt_trained_index(self):
+        """Swap in a finished background-trained index, filling it with the rows compressed so far"""
+        import faiss
+        
+        if self._training is None or not self._training.done():
+            return
+        future, self._training = self._training, None
+        try:
+            index = future.result()
+        except Exception as e:
+            st.warning(f"Could not train the compressed vector index: {e}")
+            return
+        if isinstance(self._compressed_index, faiss.IndexIVF):
+            return
+        # Only training depended on the snapshot; rows are added under their current positions
+        self._add_rows(index, 0, self._n_compressed)
+        self._compressed_index = index
+    
+    def _add_rows(self, index, start: int, end: int):
+        """Add the live embedding rows in [start, end) to index under their positions"""
+        import numpy as np
+        
+        ids = np.arange(start, end, dtype=np.int64)
+        if self._deleted:
+            ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype=np.int64))]
+        if len(ids):
+            index.add_with_ids(self.embeddings[ids], ids)
+    
+    def _ensure_vectors(self) -> bool:
+        """Embed chunks that have no vector yet; True when every chunk is indexed"""
+        import numpy as np
+        
+        n_embedded = len(self.embeddings)
+        if n_embedded == len(self.documents):
+            return True
+        if not self.client:
+            return False
+        
+        try:
+            vectors = self._embed(self.documents[n_embedded:], "RETRIEVAL_DOCUMENT")
+        except Exception as e:
+            st.warning(f"Could not compute embeddings, using keyword search: {e}")
+            return False
+        
+        self.embeddings = np.vstack([self.embeddings, vectors])
+        self._index_rows(n_embedded)
+        self._append_vectors(vectors)
+        return True
+    
+    def _snapshot_vectors_file(self, generation: int) -> str:
+        """Path of the embedding matrix written by the given snapshot"""
+        return f"data/embeddings.{generation}.npy"
+    
+    def _compressed_index_file(self, generation: int) -> str:
+        """Path of the trained compressed index written by the given snapshot"""
+        return f"data/embeddings.{generation}.faiss"
+    
+    def _vector_log_file(self) -> str:
+        """Path of the vectors appended since the current snapshot"""
+        return f"data/embeddings_log.{self._generation}.f32"
+    
+    def _append_log(self, record: Dict[str, Any]):
+        """Append one operation to the log instead of rewriting the whole index"""
+        try:
+            os.makedirs("data", exist_ok=True)
+            with open(self.log_file, 'ab') as f:
+                f.write(json_compat.dumps_bytes({'gen': self._generation, **record}) + b'\n')
+            self._log_ops += 1
+        except Exception as e:
+            st.error(f"Error saving index: {e}")
+    
+    def _append_vectors(self, vectors):
+        """Append newly embedded rows to the raw float32 vector log"""
+        try:
+            os.makedirs("data", exist_ok=True)
+            with open(self._vector_log_file(), 'ab') as f:
+                f.write(vectors.tobytes())
+        except Exception as e:
+            st.error(f"Error saving embeddings: {e}")
+    
+    def _maybe_snapshot(self):
+        """Fold the logs into a snapshot once they get long"""
+        if self._log_ops >= _SNAPSHOT_EVERY:
+            self.save_index()
     
     def save_index(self):
-        """Save index and metadata to disk"""
+        """Write a full snapshot of chunks and vectors, then drop the logs it replaces"""
+        import numpy as np
+        import faiss
+        
         try:
             os.makedirs("data", exist_ok=True)
+            old_generation = self._generation
+            generation = old_generation + 1
             
-            with open(self.index_file, 'wb') as f:
-                pickle.dump({
+            # Vectors go to a new generation-tagged file, so the current snapshot stays valid until the JSON is swapped
+            vectors_file = self._snapshot_vectors_file(generation)
+            with open(f"{vectors_file}.tmp", 'wb') as f:
+                np.save(f, self.embeddings)
+            os.replace(f"{vectors_file}.tmp", vectors_file)
+            
+            # The trained compressed index is saved too; IVF+PQ training is too slow to repeat on every load
+            if self._compressed_index is not None:
+                faiss_file = self._compressed_index_file(generation)
+                faiss.write_index(self._compressed_index, f"{faiss_file}.tmp")
+                os.replace(f"{faiss_file}.tmp", faiss_file)
+            
+            # Write to a temp file and rename so a crash never leaves a torn index
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(json_compat.dumps_bytes({
+                    'generation': generation,
                     'documents': self.documents,
-                    'metadata': self.metadata
-                }, f)
+                    'doc_ids': self.doc_ids,
+                    'chunk_ids': self.chunk_ids,
+                    'doc_meta': self.doc_meta,
+                    'deleted': sorted(self._deleted),
+                    'n_compressed': self._n_compressed
+                }))
+            os.replace(tmp_file, self.index_file)
         except Exception as e:
             st.error(f"Error saving index: {e}")
+            return
+        
+        # Older files are now unreferenced; log records left behind carry the old generation and are ignored
+        stale_files = [
+            self.log_file, self._vector_log_file(),
+            self._snapshot_vectors_file(old_generation), self._compressed_index_file(old_generation),
+            self.legacy_vectors_file
+        ]
+        self._generation = generation
+        self._log_ops = 0
+        for path in stale_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
     
     def load_index(self):
-        """Load index and metadata from disk"""
+        """Load the latest snapshot and replay the logs written since"""
+        import numpy as np
+        
+        self._set_vectors(np.empty((0, self.dimension), dtype=np.float32))
         try:
             if os.path.exists(self.index_file):
                 with open(self.index_file, 'rb') as f:
-                    data = pickle.load(f)
-                
-                self.documents = data.get('documents', [])
-                self.metadata = data.get('metadata', [])
+                    data = json_compat.loads(f.read())
+            elif os.path.exists(self.legacy_index_file):
+                data = self._load_legacy_index()
+            else:
+                data = {}
+            
+            self.documents = data.get('documents', [])
+            if 'metadata' in data:
+                # Older indexes kept a full metadata dict per chunk
+                self._split_metadata(data['metadata'])
+            else:
+                self.doc_ids = data.get('doc_ids', [])
+                self.chunk_ids = data.get('chunk_ids', [])
+                self.doc_meta = data.get('doc_meta', {})
+            self._deleted = set(data.get('deleted', []))
+            self._generation = data.get('generation', 0)
+            self._rebuild_doc_map()
+            
+            # Indexes from before generations were introduced are rewritten in the current layout
+            legacy = bool(data) and 'generation' not in data
+            needs_snapshot = legacy or not self._replay_log()
         except Exception as e:
             # If loading fails, start with empty index
             self.documents = []
-            self.metadata = []
+            self.doc_ids = []
+            self.chunk_ids = []
+            self.doc_meta = {}
+            self._deleted = set()
+            self._by_doc = {}
+            return
+        
+        try:
+            parts = []
+            vectors_file = self.legacy_vectors_file if legacy else self._snapshot_vectors_file(self._generation)
+            if os.path.exists(vectors_file):
+                # Memory-map instead of reading into RAM; FAISS copies what it needs when the index is built
+                parts.append(np.load(vectors_file, mmap_mode='r'))
+            if os.path.exists(self._vector_log_file()):
+                raw = np.fromfile(self._vector_log_file(), dtype=np.float32)
+                n_rows = len(raw) // self.dimension
+                # A torn final row would misalign later appends, so rewrite the store
+                needs_snapshot = needs_snapshot or n_rows * self.dimension != len(raw)
+                parts.append(raw[:n_rows * self.dimension].reshape(n_rows, self.dimension))
+            
+            if parts:
+                vectors = parts[0] if len(parts) == 1 else np.vstack(parts)
+                # Vectors only ever cover a prefix of the chunks; anything else is stale
+                if vectors.ndim == 2 and vectors.shape[1] == self.dimension and len(vectors) <= len(self.documents):
+                    n_compressed = data.get('n_compressed', 0)
+                    self._set_vectors(vectors, self._load_compressed_index(n_compressed, len(vectors)), n_compressed)
+                else:
+                    needs_snapshot = True
+        except Exception as e:
+            # Missing vectors are recomputed on the next search
+            needs_snapshot = True
+        
+        if needs_snapshot or self._log_ops >= _SNAPSHOT_EVERY:
+            self.save_index()
+    
+    def _load_compressed_index(self, n_compressed: int, n_vectors: int):
+        """Read the saved compressed index for the loaded generation, or None if absent or unusable"""
+        import faiss
+        
+        faiss_file = self._compressed_index_file(self._generation)
+        if not self.quantize or not n_compressed or not os.path.exists(faiss_file):
+            return None
+        try:
+            index = faiss.read_index(faiss_file)
+        except Exception as e:
+            return None
+        # It must be keyed by row position and cover a prefix of the vectors it was saved with
+        if not isinstance(index, (faiss.IndexIVF, faiss.IndexIDMap2)):
+            return None
+        if index.d != self.dimension or index.ntotal > n_compressed or n_compressed > n_vectors:
+            return None
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = _IVF_NPROBE
+        return index
+    
+    def _replay_log(self) -> bool:
+        """Apply logged operations for the loaded generation; False if the log has a torn tail"""
+        if not os.path.exists(self.log_file):
+            return True
+        
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = json_compat.loads(line)
+                except ValueError:
+                    return False
+                if record.get('gen') != self._generation:
+                    continue
+                
+                try:
+                    if record['op'] == 'add':
+                        self._append_chunks(record['metadata'], record['chunks'])
+                    elif record['op'] == 'remove':
+                        self._tombstone(record['document_id'])
+                except (KeyError, TypeError):
+                    return False
+                self._log_ops += 1
+        return True
+    
+    def _rebuild_doc_map(self):
+        """Recompute the document_id -> chunk positions map"""
+        self._by_doc = {}
+        for i, document_id in enumerate(self.doc_ids):
+            if i not in self._deleted:
+                self._by_doc.setdefault(document_id, []).append(i)
+    
+    def _split_metadata(self, metadata: List[Dict[str, Any]]):
+        """Convert per-chunk metadata dicts into parallel chunk lists and per-document metadata"""
+        self.doc_ids = [meta.get('document_id') for meta in metadata]
+        self.chunk_ids = [meta.get('chunk_id', 0) for meta in metadata]
+        self.doc_meta = {}
+        for meta in metadata:
+            if meta.get('document_id') not in self.doc_meta:
+                self.doc_meta[meta.get('document_id')] = {
+                    key: value for key, value in meta.items() if key not in ('chunk_id', 'chunk_text')
+                }
+    
+    def _load_legacy_index(self) -> Dict[str, Any]:
+        """Read an index written by older versions; load_index migrates it to JSON"""
+        import pickle
+        
+        with open(self.legacy_index_file, 'rb') as f:
+            return pickle.load(f)
     
     def get_document_stats(self) -> Dict[str, int]:
         """Get statistics about the document store"""
+        # All O(1): live documents are the keys of _by_doc, and index_size counts embedded rows
         stats = {
-            'total_chunks': len(self.documents),
-            'total_documents': len(set(meta.get('document_id', '') for meta in self.metadata)),
-            'index_size': len(self.documents)
+            'total_chunks': len(self.documents) - len(self._deleted),
+            'total_documents': len(self._by_doc),
+            'index_size': len(self.embeddings)
         }
         return stats
+
+@st.cache_resource
+def get_embeddings() -> DocumentEmbeddings:
+    """Vector store shared by every page and session"""
+    return DocumentEmbeddings()
@@ -0,0 +1,32 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+def dumps(obj: Any) -> str:
+    """Serialize to a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            # orjson rejects some inputs json accepts (e.g. non-str dict keys)
+            pass
+    return json.dumps(obj)
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize to UTF-8 encoded JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,65 @@
+import os
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Optional
+
+class LLMCache:
+    """On-disk cache of model responses keyed by a hash of the request"""
+    
+    def __init__(self, path: str = "data/llm_cache.sqlite3", max_entries: int = 5000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the request parts into a fixed-size key"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None on a miss"""
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logging.error(f"LLM cache read failed: {e}")
+            return None
+    
+    def set(self, key: str, response: str):
+        """Store a response, dropping the oldest entries beyond max_entries"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, time.time())
+                )
+                self._conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        except sqlite3.Error as e:
+            logging.error(f"LLM cache write failed: {e}")
+
+@lru_cache(maxsize=1)
+def get_llm_cache() -> LLMCache:
+    """Process-wide response cache"""
+    return LLMCache()
@@ -1,23 +1,100 @@
-import json
 import logging
 import os
-from typing import List, Dict, Any
-from google import genai
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
 from google.genai import types
 import streamlit as st
+from backend import json_compat
+from backend.clients import get_genai_client
+from backend.llm_cache import LLMCache, get_llm_cache
+from backend.utils import content_digest
+
+# Part of every cache key; bump when prompts change so stale responses aren't reused
+_PROMPT_VERSION = "1"
+_RELEVANCE_BATCH_SIZE = 8  # Documents per cross-reference request; larger batches mostly add decode time
+_RELEVANCE_EXCERPT = 1500  # Characters of each document shown to the model when judging relevance
+_RELEVANCE_RETRIES = 2  # Extra attempts for a failed batch request, with exponential backoff from 1s
+# Fields of a relevance judgement; passed as a response schema so the model can only return parseable results
+_RELEVANCE_PROPERTIES = {
+    'is_relevant': types.Schema(type=types.Type.BOOLEAN),
+    'relevance_score': types.Schema(type=types.Type.NUMBER),
+    'relationship': types.Schema(type=types.Type.STRING),
+    'key_points': types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING))
+}
+
+def _session_api_key() -> str:
+    """Gemini API key of the current session, falling back to the environment"""
+    return st.session_state.get('gemini_api_key') or os.environ.get("GEMINI_API_KEY", "")
 
 class AIOrchestrator:
     """LangChain-style orchestrator for AI-powered learning content generation"""
     
-    def __init__(self):
-        api_key = st.session_state.get('gemini_api_key') or os.environ.get("GEMINI_API_KEY", "")
+    def __init__(self, api_key: Optional[str] = None):
+        api_key = api_key or _session_api_key()
         if not api_key:
             raise ValueError("Gemini API key not found in session or environment")
-        self.client = genai.Client(api_key=api_key)
+        self.client = get_genai_client(api_key)
+    
+    def _generate(self, model: str, prompt: str, json_output: bool = False,
+                  schema: Optional[types.Schema] = None, cache: bool = True) -> str:
+        """Call Gemini, reusing the stored response for an identical earlier request unless cache is False"""
+        mime_type = "application/json" if json_output else "text/plain"
+        if cache:
+            llm_cache = get_llm_cache()
+            key_parts = [model, mime_type, _PROMPT_VERSION, prompt]
+            if schema is not None:
+                key_parts.append(schema.model_dump_json(exclude_none=True))
+            key = LLMCache.make_key(*key_parts)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
         
-    def generate_summary(self, text: str, title: str = "") -> str:
-        """Generate a comprehensive markdown-formatted summary"""
-        prompt = f"""
+        config = None
+        if json_output:
+            config = types.GenerateContentConfig(response_mime_type=mime_type, response_schema=schema)
+        response = self.client.models.generate_content(model=model, contents=prompt, config=config)
+        text = response.text or ""
+        
+        # Only keep usable responses; empty or malformed output is retried next time
+        if text:
+            if json_output:
+                json_compat.loads(text)
+            if cache:
+                llm_cache.set(key, text)
+        return text
+    
+    def _generate_stream(self, model: str, prompt: str) -> Iterator[str]:
+        """Stream a text response as it is generated, replaying the stored response for an identical earlier request"""
+        cache = get_llm_cache()
+        key = LLMCache.make_key(model, "text/plain", _PROMPT_VERSION, prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        for chunk in self.client.models.generate_content_stream(model=model, contents=prompt):
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+        # Only complete responses are stored; an interrupted stream is regenerated next time
+        if chunks:
+            cache.set(key, "".join(chunks))
+    
+    def embed(self, text: str):
+        """Unit-length embedding of text, for similarity lookups"""
+        import numpy as np
+        
+        config = types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")
+        response = self.client.models.embed_content(model="text-embedding-004", contents=[text], config=config)
+        vector = np.asarray(response.embeddings[0].values, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+        
+    @staticmethod
+    def _summary_prompt(text: str, title: str) -> str:
+        """Prompt shared by generate_summary and generate_summary_stream"""
+        return f"""
         Please create a comprehensive markdown-formatted summary of the following document.
         
         Document Title: {title}
@@ -32,17 +109,61 @@ class AIOrchestrator:
         Document Content:
         {text}
         """
+    
+    def generate_summary(self, text: str, title: str = "") -> str:
+        """Generate a comprehensive markdown-formatted summary"""
+        prompt = self._summary_prompt(text, title)
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            return response.text or "Failed to generate summary"
+            return self._generate("gemini-2.5-flash", prompt) or "Failed to generate summary"
         except Exception as e:
             logging.error(f"Summary generation failed: {e}")
             return f"Error generating summary: {str(e)}"
     
+    def has_cached_summary(self, text: str, title: str = "") -> bool:
+        """Whether the LLM cache already holds the summary generate_summary(_stream) would produce"""
+        key = LLMCache.make_key("gemini-2.5-flash", "text/plain", _PROMPT_VERSION, self._summary_prompt(text, title))
+        return get_llm_cache().get(key) is not None
+    
+    def generate_summary_stream(self, text: str, title: str = "") -> Iterator[str]:
+        """Generate the same summary as generate_summary, yielding text as it arrives; errors are raised"""
+        return self._generate_stream("gemini-2.5-flash", self._summary_prompt(text, title))
+    
+    def compare_documents_stream(self, doc1: Dict[str, Any], doc2: Dict[str, Any], comparison_type: str,
+                                 detail_level: str) -> Iterator[str]:
+        """Stream a markdown comparison of two documents as it is generated; errors are raised"""
+        prompt = f"""
+        Compare the following two documents and provide a {comparison_type.lower()} analysis.
+        Detail level: {detail_level}
+        
+        Document 1: {doc1['title']}
+        Content: {doc1['content'][:2000]}...
+        
+        Document 2: {doc2['title']}
+        Content: {doc2['content'][:2000]}...
+        
+        Please provide:
+        1. Main similarities between the documents
+        2. Key differences in content and approach
+        3. Unique insights from each document
+        4. Synthesis of both documents
+        
+        Format your response in clear markdown with headers and bullet points.
+        """
+        return self._generate_stream("gemini-2.5-flash", prompt)
+    
+    def answer_question_stream(self, question: str, context: str) -> Iterator[str]:
+        """Stream a reference answer to a question from document context as it is generated; errors are raised"""
+        prompt = f"""
+        Based on the following document, provide a comprehensive answer to this question: {question}
+        
+        Document content:
+        {context}
+        
+        Provide a detailed, accurate answer based only on the document content.
+        """
+        return self._generate_stream("gemini-2.5-flash", prompt)
+    
     def generate_mcq_quiz(self, text: str, num_questions: int = 5) -> List[Dict[str, Any]]:
         """Generate multiple choice quiz questions from text"""
         prompt = f"""
@@ -76,16 +197,11 @@ class AIOrchestrator:
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
+            # Not cached: generating again for the same document should give a fresh set for retakes
+            response_text = self._generate("gemini-2.5-pro", prompt, json_output=True, cache=False)
             
-            if response.text:
-                questions = json.loads(response.text)
+            if response_text:
+                questions = json_compat.loads(response_text)
                 return questions
             else:
                 return []
@@ -119,16 +235,11 @@ class AIOrchestrator:
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
+            # Not cached: generating again for the same document should give a fresh set for retakes
+            response_text = self._generate("gemini-2.5-pro", prompt, json_output=True, cache=False)
             
-            if response.text:
-                exercises = json.loads(response.text)
+            if response_text:
+                exercises = json_compat.loads(response_text)
                 return exercises
             else:
                 return []
@@ -168,7 +279,7 @@ class AIOrchestrator:
             )
             
             if response.text:
-                evaluation = json.loads(response.text)
+                evaluation = json_compat.loads(response.text)
                 return evaluation
             else:
                 return {"score": 0, "is_correct": False, "feedback": "Evaluation failed"}
@@ -176,6 +287,87 @@ class AIOrchestrator:
             logging.error(f"Answer evaluation failed: {e}")
             return {"score": 0, "is_correct": False, "feedback": f"Error: {str(e)}"}
     
+    def evaluate_answers_batch(self, items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Evaluate several answers in one request; items have question, correct_answer and user_answer"""
+        if not items:
+            return []
+        
+        answers = "\n".join(
+            f"""
+        Item {i + 1}:
+        Question: {item['question']}
+        Correct Answer: {item['correct_answer']}
+        User Answer: {item['user_answer']}
+        """
+            for i, item in enumerate(items)
+        )
+        prompt = f"""
+        Evaluate the similarity between the correct answer and the user's answer for each of the
+        {len(items)} items below.
+        
+        For each item provide:
+        1. A similarity score from 0-100
+        2. Feedback explaining the evaluation
+        3. Whether the answer should be considered correct (threshold: 70%)
+        
+        Return a JSON array with exactly one evaluation per item, in the same order as the items.
+        {answers}
+        """
+        
+        # The schema keeps the model to one well-formed object per item
+        schema = types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    'score': types.Schema(type=types.Type.NUMBER),
+                    'is_correct': types.Schema(type=types.Type.BOOLEAN),
+                    'feedback': types.Schema(type=types.Type.STRING)
+                },
+                required=['score', 'is_correct', 'feedback']
+            )
+        )
+        
+        try:
+            response = self.client.models.generate_content(
+                model="gemini-2.5-pro",
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=schema
+                )
+            )
+            evaluations = json_compat.loads(response.text) if response.text else []
+        except Exception as e:
+            logging.error(f"Batch answer evaluation failed: {e}")
+            evaluations = []
+        
+        if isinstance(evaluations, list) and len(evaluations) == len(items):
+            return evaluations
+        
+        # Misaligned or failed batch: evaluate one by one so every answer still gets a result
+        logging.warning("Batch evaluation returned an unexpected result, evaluating answers individually")
+        return [
+            self.evaluate_answer(item['question'], item['correct_answer'], item['user_answer'])
+            for item in items
+        ]
+    
+    def generate_study_pack(self, text: str, title: str = "", num_questions: int = 5,
+                            parts: Iterable[str] = ('summary', 'key_concepts', 'mcq_quiz', 'completion_exercises')) -> Dict[str, Any]:
+        """Generate several kinds of content for the same text concurrently"""
+        generators = {
+            'summary': lambda: self.generate_summary(text, title),
+            'key_concepts': lambda: self.extract_key_concepts(text),
+            'mcq_quiz': lambda: self.generate_mcq_quiz(text, num_questions),
+            'completion_exercises': lambda: self.generate_completion_exercise(text, num_questions)
+        }
+        parts = list(parts)
+        
+        # Each call is network-bound, so total latency is the slowest call rather than the sum
+        with ThreadPoolExecutor(max_workers=max(len(parts), 1)) as executor:
+            futures = {part: executor.submit(generators[part]) for part in parts}
+            return {part: future.result() for part, future in futures.items()}
+    
     def extract_key_concepts(self, text: str) -> List[str]:
         """Extract key concepts and terms from text"""
         prompt = f"""
@@ -188,19 +380,164 @@ class AIOrchestrator:
         """
         
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
+            response_text = self._generate("gemini-2.5-flash", prompt, json_output=True)
             
-            if response.text:
-                concepts = json.loads(response.text)
+            if response_text:
+                concepts = json_compat.loads(response_text)
                 return concepts if isinstance(concepts, list) else []
             else:
                 return []
         except Exception as e:
             logging.error(f"Concept extraction failed: {e}")
             return []
+    
+    def assess_relevance(self, concept: str, title: str, text: str) -> Dict[str, Any]:
+        """Judge whether and how a document relates to a concept; empty if the call fails"""
+        prompt = f"""
+        Analyze if the following document discusses or relates to the concept: "{concept}"
+        
+        Document: {title}
+        Content: {text}...
+        
+        If relevant, provide:
+        1. How this document relates to "{concept}" (1-2 sentences)
+        2. Key relevant quotes or sections
+        3. Relevance score (0-10)
+        
+        Return JSON format:
+        {{
+            "is_relevant": true/false,
+            "relevance_score": 0-10,
+            "relationship": "description",
+            "key_points": ["point1", "point2"]
+        }}
+        """
+        
+        try:
+            response_text = self._generate(
+                "gemini-2.5-flash", prompt, json_output=True,
+                schema=types.Schema(type=types.Type.OBJECT, properties=_RELEVANCE_PROPERTIES,
+                                    required=list(_RELEVANCE_PROPERTIES))
+            )
+            result = json_compat.loads(response_text) if response_text else {}
+            return result if isinstance(result, dict) else {}
+        except Exception as e:
+            logging.error(f"Relevance assessment failed: {e}")
+            return {}
+    
+    def assess_relevance_batch(self, concept: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Judge several documents against a concept in one request, returning results in document order"""
+        if not documents:
+            return []
+        
+        excerpts = "\n---\n".join(
+            f"""
+        Document {i + 1}: {document['title']}
+        Content: {document['content'][:_RELEVANCE_EXCERPT]}...
+        """
+            for i, document in enumerate(documents)
+        )
+        prompt = f"""
+        Analyze whether each of the following {len(documents)} documents discusses or relates to the concept: "{concept}"
+        
+        For each document provide:
+        1. Its document number
+        2. Whether it is relevant
+        3. How it relates to "{concept}" (1-2 sentences)
+        4. Key relevant quotes or sections
+        5. Relevance score (0-10)
+        
+        Return a JSON array with exactly one result per document.
+        {excerpts}
+        """
+        
+        # The schema keeps the model to one well-formed object per document
+        schema = types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={'document': types.Schema(type=types.Type.INTEGER), **_RELEVANCE_PROPERTIES},
+                required=['document', *_RELEVANCE_PROPERTIES]
+            )
+        )
+        
+        for attempt in range(_RELEVANCE_RETRIES + 1):
+            try:
+                response = self.client.models.generate_content(
+                    model="gemini-2.5-flash",
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=schema
+                    )
+                )
+                results = json_compat.loads(response.text) if response.text else []
+                break
+            except Exception as e:
+                logging.error(f"Batch relevance assessment failed (attempt {attempt + 1}): {e}")
+                if attempt < _RELEVANCE_RETRIES:
+                    time.sleep(2 ** attempt)
+        else:
+            # Falling back to one request per document would multiply the load that likely caused the
+            # failure (e.g. rate limiting), so these documents are left unassessed
+            return [{} for _ in documents]
+        
+        by_number = {}
+        if isinstance(results, list):
+            by_number = {r.get('document'): r for r in results if isinstance(r, dict)}
+        
+        # Documents missing from a successful response are assessed on their own so each still gets a result
+        return [
+            by_number.get(i + 1)
+            or self.assess_relevance(concept, document['title'], document['content'][:_RELEVANCE_EXCERPT])
+            for i, document in enumerate(documents)
+        ]
+    
+    def assess_relevance_many(self, concept: str, documents: List[Dict[str, Any]], max_workers: int = 8,
+                              on_progress: Optional[Callable[[int, int, List[Optional[Dict[str, Any]]]], None]] = None
+                              ) -> List[Dict[str, Any]]:
+        """Assess documents in batches of _RELEVANCE_BATCH_SIZE, sent concurrently, returning results in document order"""
+        if not documents:
+            return []
+        
+        # Documents with the same excerpt (re-uploads, copies) would get the same prompt, so each
+        # distinct excerpt is assessed once and its result shared
+        keys = [content_digest(document['content'][:_RELEVANCE_EXCERPT]) for document in documents]
+        positions = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+        unique = [documents[indices[0]] for indices in positions.values()]
+        unique_keys = list(positions)
+        
+        results = [None] * len(documents)
+        starts = range(0, len(unique), _RELEVANCE_BATCH_SIZE)
+        done = 0
+        
+        # Network-bound calls; max_workers also caps how many requests are in flight at once
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(starts))) as executor:
+            futures = {
+                executor.submit(self.assess_relevance_batch, concept, unique[start:start + _RELEVANCE_BATCH_SIZE]): start
+                for start in starts
+            }
+            for future in as_completed(futures):
+                start = futures[future]
+                for key, result in zip(unique_keys[start:], future.result()):
+                    for i in positions[key]:
+                        results[i] = result
+                        done += 1
+                # Called from this thread, so the callback may update the page; pending documents are None
+                if on_progress:
+                    on_progress(done, len(documents), results)
+        return results
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _orchestrator_for_key(api_key: str) -> AIOrchestrator:
+    """One orchestrator per API key, shared by every page and session using that key"""
+    return AIOrchestrator(api_key)
+
+def get_orchestrator() -> AIOrchestrator:
+    """Orchestrator for the current session's API key; raises ValueError if there is none"""
+    api_key = _session_api_key()
+    if not api_key:
+        raise ValueError("Gemini API key not found in session or environment")
+    return _orchestrator_for_key(api_key)
@@ -0,0 +1,55 @@
+import threading
+from typing import Any, Callable, Optional
+import numpy as np
+import streamlit as st
+
+class SemanticResponseCache:
+    """Thread-safe cache of responses keyed by unit-length embeddings, matched by cosine similarity"""
+    
+    def __init__(self, dimension: int = 768, threshold: float = 0.95, capacity: int = 1024):
+        self.threshold = threshold
+        self.capacity = capacity
+        # One contiguous row per entry, so a lookup is a single matrix-vector product
+        self._vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self._payloads = [None] * capacity
+        self._size = 0
+        self._next = 0  # Slot written next; the oldest entry is overwritten once full
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, vector: np.ndarray, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """Return the most similar payload above the threshold that accept() allows, or None"""
+        with self._lock:
+            scores = self._vectors[:self._size] @ vector
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for i in candidates[np.argsort(-scores[candidates])]:
+                payload = self._payloads[i]
+                if accept is None or accept(payload):
+                    self.hits += 1
+                    return payload
+            self.misses += 1
+            return None
+    
+    def add(self, vector: np.ndarray, payload: Any):
+        """Store a payload under its embedding"""
+        with self._lock:
+            self._vectors[self._next] = vector
+            self._payloads[self._next] = payload
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._payloads = [None] * self.capacity
+            self._size = 0
+            self._next = 0
+    
+    def __len__(self) -> int:
+        return self._size
+
+@st.cache_resource(show_spinner=False)
+def get_summary_cache() -> SemanticResponseCache:
+    """Process-wide cache of generated summaries, shared across reruns and sessions"""
+    return SemanticResponseCache()
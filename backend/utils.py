@@ -3,51 +3,78 @@ import PyPDF2
 import docx
 import io
 import arxiv
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple, Iterable
 from datetime import datetime
 import uuid
+import hashlib
+import time
+from collections import deque
+from functools import lru_cache
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from backend.clients import get_arxiv_client, get_http_client
+
+ACTIVITY_LOG_SIZE = 50  # Activities kept in session state
+RECENT_ACTIVITY_SIZE = 10  # Activities shown, pre-formatted, in the dashboard feed
+QUIZ_HISTORY_SIZE = 500  # Quiz results kept in session state; quiz_stats covers all of them
+PREVIEW_LENGTH = 300  # Characters of content shown in document previews
 
 def initialize_session_state():
     """Initialize session state variables"""
-    from backend.database import Database
+    from backend.database import get_db, cached_documents, cached_summaries
     
     # Initialize database-backed data if user is authenticated
     if st.session_state.get('authenticated') and st.session_state.get('user_id'):
         try:
-            db = Database()
+            db = get_db()
             user_id = st.session_state.user_id
             
             if 'documents' not in st.session_state:
-                st.session_state.documents = db.get_documents(user_id)
+                st.session_state.documents = cached_documents(user_id)
             
-            if 'summaries' not in st.session_state:
-                st.session_state.summaries = db.get_summaries(user_id)
+            if 'summaries_by_id' not in st.session_state:
+                # The database returns newest first; the session library is kept oldest first
+                _set_summaries(reversed(cached_summaries(user_id)))
             
             if 'quiz_history' not in st.session_state:
-                st.session_state.quiz_history = db.get_quiz_history(user_id)
+                _set_quiz_history(db.get_quiz_history(user_id))
             
             if 'activity_log' not in st.session_state:
-                st.session_state.activity_log = db.get_activity_log(user_id)
+                # The database returns newest first; the session log is kept oldest first
+                st.session_state.activity_log = deque(reversed(db.get_activity_log(user_id)), maxlen=ACTIVITY_LOG_SIZE)
         except Exception as e:
             # Fallback to session-only storage if DB fails
             if 'documents' not in st.session_state:
                 st.session_state.documents = []
-            if 'summaries' not in st.session_state:
-                st.session_state.summaries = []
+            if 'summaries_by_id' not in st.session_state:
+                _set_summaries([])
             if 'quiz_history' not in st.session_state:
-                st.session_state.quiz_history = []
+                _set_quiz_history([])
             if 'activity_log' not in st.session_state:
-                st.session_state.activity_log = []
+                st.session_state.activity_log = deque(maxlen=ACTIVITY_LOG_SIZE)
     else:
         # Not authenticated, use empty session state
         if 'documents' not in st.session_state:
             st.session_state.documents = []
-        if 'summaries' not in st.session_state:
-            st.session_state.summaries = []
+        if 'summaries_by_id' not in st.session_state:
+            _set_summaries([])
         if 'quiz_history' not in st.session_state:
-            st.session_state.quiz_history = []
+            _set_quiz_history([])
         if 'activity_log' not in st.session_state:
-            st.session_state.activity_log = []
+            st.session_state.activity_log = deque(maxlen=ACTIVITY_LOG_SIZE)
+    
+    if 'documents_by_id' not in st.session_state:
+        # Lookup index and word total over st.session_state.documents; add_session_document and
+        # remove_document_by_id keep them in sync
+        st.session_state.documents_by_id = {doc['id']: doc for doc in st.session_state.documents}
+        st.session_state.total_words = sum(doc.get('word_count', 0) for doc in st.session_state.documents)
+    
+    if 'recent_activities_fmt' not in st.session_state:
+        # (time, action) pairs for the dashboard feed, oldest first; log_activities appends to it
+        st.session_state.recent_activities_fmt = deque(
+            (_format_activity(activity) for activity in st.session_state.activity_log), maxlen=RECENT_ACTIVITY_SIZE
+        )
     
     if 'current_quiz' not in st.session_state:
         st.session_state.current_quiz = None
@@ -55,28 +82,73 @@ def initialize_session_state():
     if 'quiz_state' not in st.session_state:
         st.session_state.quiz_state = {}
 
+def _set_quiz_history(history: List[Dict[str, Any]]):
+    """Load quiz results (newest first, as the database returns them) and their running totals"""
+    # Kept oldest first so [-1] is the latest result
+    st.session_state.quiz_history = deque(reversed(history), maxlen=QUIZ_HISTORY_SIZE)
+    st.session_state.quiz_stats = {
+        'count': len(history),
+        'total_score': sum(quiz.get('score', 0) for quiz in history)
+    }
+
+def record_quiz_result(result: Dict[str, Any]):
+    """Add a completed quiz to the session history and queue its database save"""
+    from backend.database import get_writer
+    
+    st.session_state.quiz_history.append(result)
+    stats = st.session_state.quiz_stats
+    stats['count'] += 1
+    stats['total_score'] += result.get('score', 0)
+    
+    # The background writer commits it without holding up the rerun, and flushes what is left at exit
+    if st.session_state.get('user_id'):
+        try:
+            if not get_writer().enqueue(("save_quiz_result", st.session_state.user_id, result)):
+                st.error("Could not save quiz result: the write queue is full")
+        except Exception as e:
+            st.error(f"Error saving quiz result: {e}")
+
+def average_quiz_score() -> float:
+    """Average score over every recorded quiz, from the running totals"""
+    stats = st.session_state.quiz_stats
+    return stats['total_score'] / stats['count'] if stats['count'] else 0
+
+def _format_activity(activity: Dict[str, Any]) -> Tuple[str, str]:
+    """(time, action) as shown in the recent activity feed"""
+    timestamp = activity['timestamp']
+    try:
+        time_str = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime('%m/%d %H:%M')
+    except:
+        time_str = timestamp
+    return time_str, activity['action']
+
 def log_activity(action: str):
     """Log user activity with timestamp"""
-    from backend.database import Database
+    log_activities([action])
+
+def log_activities(actions: List[str]):
+    """Log several user activities at once, e.g. one per file in a batch upload"""
+    from backend.database import get_db
     
-    activity = {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M'),
-        'action': action,
-        'user_id': st.session_state.get('user_id', 'anonymous')
-    }
-    st.session_state.activity_log.append(activity)
+    if not actions:
+        return
+    
+    timestamp = time.strftime('%Y-%m-%d %H:%M')
+    user_id = st.session_state.get('user_id', 'anonymous')
+    # Bounded deque: the oldest entries are dropped once ACTIVITY_LOG_SIZE is reached
+    st.session_state.activity_log.extend(
+        {'timestamp': timestamp, 'action': action, 'user_id': user_id} for action in actions
+    )
+    time_str = time.strftime('%m/%d %H:%M')
+    st.session_state.recent_activities_fmt.extend((time_str, action) for action in actions)
     
-    # Save to database if authenticated
+    # Save to database if authenticated; this only queues the rows for the background writer
     if st.session_state.get('authenticated') and st.session_state.get('user_id'):
         try:
-            db = Database()
-            db.log_activity(st.session_state.user_id, action)
+            db = get_db()
+            db.log_activities(st.session_state.user_id, actions)
         except:
             pass  # Fail silently
-    
-    # Keep only last 50 activities in session
-    if len(st.session_state.activity_log) > 50:
-        st.session_state.activity_log = st.session_state.activity_log[-50:]
 
 def extract_text_from_pdf(file_bytes: bytes) -> str:
     """Extract text from PDF file"""
@@ -84,9 +156,8 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         pdf_file = io.BytesIO(file_bytes)
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+        # Collect page texts and join once; repeated += copies the whole string per page
+        text = "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
         
         return text.strip()
     except Exception as e:
@@ -97,10 +168,7 @@ def extract_text_from_docx(file_bytes: bytes) -> str:
     """Extract text from DOCX file"""
     try:
         doc = docx.Document(io.BytesIO(file_bytes))
-        text = ""
-        
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        text = "\n".join(paragraph.text for paragraph in doc.paragraphs)
         
         return text.strip()
     except Exception as e:
@@ -152,35 +220,123 @@ def process_uploaded_file(uploaded_file) -> Optional[Dict[str, Any]]:
         'file_type': file_type,
         'uploaded_at': datetime.now().isoformat(),
         'word_count': len(text.split()),
-        'source': 'upload'
+        'source': 'upload',
+        'content_digest': content_digest(text),
+        'preview': _preview_text(text)
     }
     
     return document
 
+def file_content_hash(file_bytes: bytes) -> str:
+    """Fingerprint of an uploaded file, used to recognise re-uploads"""
+    return hashlib.sha256(file_bytes, usedforsecurity=False).hexdigest()
+
+def content_digest(text: str) -> str:
+    """128-bit BLAKE2b of a document's text, used as a cache key"""
+    return hashlib.blake2b(text.encode('utf-8', 'ignore'), digest_size=16).hexdigest()
+
+def document_fingerprint(document: Dict[str, Any]) -> str:
+    """Content digest of a document; set when it is created, or computed once for documents loaded from the database"""
+    if 'content_digest' not in document:
+        document['content_digest'] = content_digest(document['content'])
+    return document['content_digest']
+
+def _preview_text(text: str) -> str:
+    """Leading excerpt of a document's text for previews"""
+    return text[:PREVIEW_LENGTH] + "..."
+
+def document_preview(document: Dict[str, Any]) -> str:
+    """Preview of a document; set when it is created, or computed once for documents loaded from the database"""
+    if 'preview' not in document:
+        document['preview'] = _preview_text(document['content'])
+    return document['preview']
+
+def process_uploaded_files(uploaded_files: List[Any], max_workers: int = 8,
+                           on_progress: Optional[Callable[[int, int], None]] = None) -> List[Optional[Dict[str, Any]]]:
+    """Process several uploaded files concurrently, returning results in upload order"""
+    total = len(uploaded_files)
+    done = 0
+    lock = threading.Lock()
+    
+    def report():
+        nonlocal done
+        with lock:
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+    
+    if total <= 1:
+        documents = []
+        for uploaded_file in uploaded_files:
+            documents.append(process_uploaded_file(uploaded_file))
+            report()
+        return documents
+    
+    # Worker threads need the script context so st.error calls and progress updates reach the page
+    ctx = get_script_run_ctx()
+    
+    def process(uploaded_file):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        document = process_uploaded_file(uploaded_file)
+        report()
+        return document
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(uploaded_files))) as executor:
+        return list(executor.map(process, uploaded_files))
+
+# Search and download results are cached across sessions; both helpers raise on failure
+# so that errors are shown to the user instead of being cached
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_arxiv_search(query: str, max_results: int) -> List[Dict[str, Any]]:
+    """Query the Arxiv API"""
+    client = get_arxiv_client()
+    search = arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.Relevance
+    )
+    
+    papers = []
+    for result in client.results(search):
+        paper = {
+            'title': result.title,
+            'authors': [author.name for author in result.authors],
+            'abstract': result.summary,
+            'url': result.entry_id,
+            'pdf_url': result.pdf_url,
+            'published': result.published.strftime('%Y-%m-%d'),
+            'categories': result.categories
+        }
+        papers.append(paper)
+    
+    return papers
+
+@st.cache_data(ttl=86400, max_entries=64, show_spinner=False)
+def _cached_arxiv_paper(paper_url: str) -> Dict[str, Any]:
+    """Fetch an Arxiv paper's metadata and PDF text; versioned PDFs don't change"""
+    client = get_arxiv_client()
+    paper = next(client.results(arxiv.Search(id_list=[paper_url.split('/')[-1]])))
+    
+    # Download the PDF into memory and extract text from it directly
+    buffer = io.BytesIO()
+    with get_http_client().stream("GET", paper.pdf_url) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes(1 << 20):
+            buffer.write(chunk)
+    
+    return {
+        'title': paper.title,
+        'content': extract_text_from_pdf(buffer.getvalue()),
+        'authors': [author.name for author in paper.authors],
+        'abstract': paper.summary,
+        'url': paper.entry_id,
+        'published': paper.published.strftime('%Y-%m-%d')
+    }
+
 def search_arxiv_papers(query: str, max_results: int = 10) -> List[Dict[str, Any]]:
     """Search for papers on Arxiv"""
     try:
-        client = arxiv.Client()
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.Relevance
-        )
-        
-        papers = []
-        for result in client.results(search):
-            paper = {
-                'title': result.title,
-                'authors': [author.name for author in result.authors],
-                'abstract': result.summary,
-                'url': result.entry_id,
-                'pdf_url': result.pdf_url,
-                'published': result.published.strftime('%Y-%m-%d'),
-                'categories': result.categories
-            }
-            papers.append(paper)
-        
-        return papers
+        return _cached_arxiv_search(query, max_results)
     except Exception as e:
         st.error(f"Error searching Arxiv: {e}")
         return []
@@ -188,36 +344,27 @@ def search_arxiv_papers(query: str, max_results: int = 10) -> List[Dict[str, Any
 def download_arxiv_paper(paper_url: str) -> Optional[Dict[str, Any]]:
     """Download and process Arxiv paper"""
     try:
-        client = arxiv.Client()
-        paper = next(client.results(arxiv.Search(id_list=[paper_url.split('/')[-1]])))
-        
-        # Download PDF
-        pdf_path = paper.download_pdf(dirpath="./data/temp/")
-        
-        # Extract text from PDF
-        with open(pdf_path, 'rb') as file:
-            text = extract_text_from_pdf(file.read())
-        
-        # Clean up temp file
-        import os
-        os.remove(pdf_path)
+        paper = _cached_arxiv_paper(paper_url)
+        text = paper['content']
         
         if not text.strip():
             return None
         
-        # Create document record
+        # Create document record; id and timestamp are per download even when the paper is cached
         document = {
             'id': str(uuid.uuid4()),
-            'title': paper.title,
+            'title': paper['title'],
             'content': text,
             'type': 'arxiv',
-            'authors': [author.name for author in paper.authors],
-            'abstract': paper.summary,
-            'url': paper.entry_id,
-            'published': paper.published.strftime('%Y-%m-%d'),
+            'authors': paper['authors'],
+            'abstract': paper['abstract'],
+            'url': paper['url'],
+            'published': paper['published'],
             'downloaded_at': datetime.now().isoformat(),
             'word_count': len(text.split()),
-            'source': 'arxiv'
+            'source': 'arxiv',
+            'content_digest': content_digest(text),
+            'preview': _preview_text(text)
         }
         
         return document
@@ -225,6 +372,23 @@ def download_arxiv_paper(paper_url: str) -> Optional[Dict[str, Any]]:
         st.error(f"Error downloading Arxiv paper: {e}")
         return None
 
+def download_arxiv_papers(paper_urls: List[str], max_workers: int = 4) -> List[Optional[Dict[str, Any]]]:
+    """Download several Arxiv papers concurrently, returning results in the given order"""
+    if len(paper_urls) <= 1:
+        return [download_arxiv_paper(paper_url) for paper_url in paper_urls]
+    
+    # Worker threads need the script context so st.error calls reach the page
+    ctx = get_script_run_ctx()
+    
+    def download(paper_url):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return download_arxiv_paper(paper_url)
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paper_urls))) as executor:
+        return list(executor.map(download, paper_urls))
+
+# Pure functions called on every render with a small set of distinct inputs
+@lru_cache(maxsize=1024)
 def calculate_reading_time(word_count: int, wpm: int = 200) -> str:
     """Calculate estimated reading time"""
     minutes = word_count / wpm
@@ -237,6 +401,7 @@ def calculate_reading_time(word_count: int, wpm: int = 200) -> str:
         mins = int(minutes % 60)
         return f"{hours}h {mins}m"
 
+@lru_cache(maxsize=1024)
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human readable format"""
     if size_bytes < 1024:
@@ -246,18 +411,78 @@ def format_file_size(size_bytes: int) -> str:
     else:
         return f"{size_bytes / (1024 * 1024):.1f} MB"
 
+def add_session_document(document: Dict[str, Any]):
+    """Add a document to the session library"""
+    add_session_documents([document])
+
+def add_session_documents(documents: List[Dict[str, Any]]):
+    """Add several documents to the session library at once"""
+    st.session_state.documents.extend(documents)
+    st.session_state.documents_by_id.update((doc['id'], doc) for doc in documents)
+    st.session_state.total_words += sum(doc.get('word_count', 0) for doc in documents)
+    _invalidate_document_options()
+
+def get_document_options() -> Dict[str, str]:
+    """Title -> id mapping for document pickers, rebuilt only when the library changes"""
+    if 'doc_options' not in st.session_state:
+        st.session_state.doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
+    return st.session_state.doc_options
+
+def get_document_titles() -> List[str]:
+    """Titles for document pickers, in library order"""
+    if 'doc_titles' not in st.session_state:
+        st.session_state.doc_titles = list(get_document_options())
+    return st.session_state.doc_titles
+
+def get_document_positions() -> Dict[str, int]:
+    """Id -> index in the document picker options, for pre-selecting a document"""
+    if 'doc_positions' not in st.session_state:
+        st.session_state.doc_positions = {doc_id: i for i, doc_id in enumerate(get_document_options().values())}
+    return st.session_state.doc_positions
+
+def _invalidate_document_options():
+    """Drop the picker mappings after the library changes"""
+    st.session_state.pop('doc_options', None)
+    st.session_state.pop('doc_positions', None)
+    st.session_state.pop('doc_titles', None)
+
 def get_document_by_id(doc_id: str) -> Optional[Dict[str, Any]]:
     """Get document by ID"""
-    for doc in st.session_state.documents:
-        if doc['id'] == doc_id:
-            return doc
-    return None
+    return st.session_state.documents_by_id.get(doc_id)
 
 def remove_document_by_id(doc_id: str) -> bool:
     """Remove document by ID"""
-    for i, doc in enumerate(st.session_state.documents):
-        if doc['id'] == doc_id:
-            del st.session_state.documents[i]
-            log_activity(f"Deleted document: {doc['title']}")
-            return True
-    return False
+    doc = st.session_state.documents_by_id.pop(doc_id, None)
+    if doc is None:
+        return False
+    st.session_state.documents.remove(doc)
+    st.session_state.total_words -= doc.get('word_count', 0)
+    _invalidate_document_options()
+    log_activity(f"Deleted document: {doc['title']}")
+    return True
+
+def _index_summary_text(summary: Dict[str, Any]):
+    """Store lowercased title and text on a summary so library searches don't re-lowercase them"""
+    summary['_title_lc'] = summary['document_title'].lower()
+    summary['_summary_lc'] = summary['summary'].lower()
+
+def _set_summaries(summaries: Iterable[Dict[str, Any]]):
+    """Replace the session summary library, oldest first; the dict keeps that order and gives O(1) deletes"""
+    st.session_state.summaries_by_id = {}
+    st.session_state.summary_words = 0
+    for summary in summaries:
+        add_session_summary(summary)
+
+def add_session_summary(summary: Dict[str, Any]):
+    """Add a summary to the session library"""
+    _index_summary_text(summary)
+    st.session_state.summaries_by_id[summary['id']] = summary
+    st.session_state.summary_words += summary.get('word_count') or 0
+
+def remove_summary_by_id(summary_id: str) -> bool:
+    """Remove summary by ID"""
+    summary = st.session_state.summaries_by_id.pop(summary_id, None)
+    if summary is None:
+        return False
+    st.session_state.summary_words -= summary.get('word_count') or 0
+    return True
@@ -2,11 +2,12 @@ import streamlit as st
 import os
 from backend.auth import check_authentication, render_logout_button
 from backend.utils import (
-    initialize_session_state, process_uploaded_file, search_arxiv_papers,
-    download_arxiv_paper, log_activity, get_document_by_id, remove_document_by_id,
-    calculate_reading_time
+    initialize_session_state, process_uploaded_files, search_arxiv_papers,
+    download_arxiv_papers, log_activities, get_document_by_id,
+    remove_document_by_id, add_session_document, add_session_documents, file_content_hash,
+    calculate_reading_time, document_preview
 )
-from backend.embeddings import DocumentEmbeddings
+from backend.embeddings import get_embeddings
 
 # Page configuration
 st.set_page_config(
@@ -26,10 +27,25 @@ initialize_session_state()
 # Render logout button
 render_logout_button()
 
-# Initialize embeddings
-@st.cache_resource
-def get_embeddings():
-    return DocumentEmbeddings()
+def save_documents(documents):
+    """Save documents to the database in one transaction; False if that failed"""
+    if not documents or not st.session_state.get('user_id'):
+        return True
+    try:
+        from backend.database import get_db
+        return get_db().save_documents_bulk(st.session_state.user_id, documents)
+    except Exception as e:
+        st.error(f"Error saving documents: {e}")
+        return False
+
+def vector_metadata(document):
+    """Metadata stored with a document's chunks in the vector store"""
+    return {
+        'document_id': document['id'],
+        'title': document['title'],
+        'type': document['type'],
+        'source': document['source']
+    }
 
 embeddings = get_embeddings()
 
@@ -55,48 +71,71 @@ with tab1:
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            processed_count = 0
+            processed_docs = []
+            
+            # Skip files already in the library: only new content is parsed and embedded
+            hashes = [file_content_hash(uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+            known_hashes = {doc.get('content_hash') for doc in st.session_state.documents}
+            stored = {}
+            if st.session_state.get('user_id'):
+                try:
+                    from backend.database import get_db
+                    stored = get_db().get_documents_by_hash(
+                        st.session_state.user_id, [h for h in set(hashes) if h not in known_hashes]
+                    )
+                except:
+                    pass
+            for document in stored.values():
+                # Saved earlier but missing from this session
+                if document['id'] not in st.session_state.documents_by_id:
+                    add_session_document(document)
+            known_hashes.update(stored)
+            
+            new_files = []
+            for uploaded_file, content_hash in zip(uploaded_files, hashes):
+                if content_hash in known_hashes:
+                    st.info(f"Already in your library: {uploaded_file.name}")
+                else:
+                    known_hashes.add(content_hash)
+                    new_files.append((uploaded_file, content_hash))
             
-            for i, uploaded_file in enumerate(uploaded_files):
+            # Extract text from all files concurrently, then index them in upload order
+            status_text.text(f"Extracting text from {len(new_files)} files...")
+            documents = process_uploaded_files(
+                [uploaded_file for uploaded_file, _ in new_files],
+                on_progress=lambda done, total: progress_bar.progress(done / total)
+            )
+            
+            for (uploaded_file, content_hash), document in zip(new_files, documents):
                 status_text.text(f"Processing: {uploaded_file.name}")
                 
-                # Process file
-                document = process_uploaded_file(uploaded_file)
-                
                 if document:
-                    # Add to session state
-                    st.session_state.documents.append(document)
-                    
-                    # Save to database
-                    from backend.database import Database
-                    if st.session_state.get('user_id'):
-                        try:
-                            db = Database()
-                            db.save_document(st.session_state.user_id, document)
-                        except:
-                            pass
-                    
-                    # Add to vector store
-                    embeddings.add_document(
-                        document['content'],
-                        {
-                            'document_id': document['id'],
-                            'title': document['title'],
-                            'type': document['type'],
-                            'source': document['source']
-                        }
-                    )
-                    
-                    processed_count += 1
-                    log_activity(f"Uploaded document: {document['title']}")
-                
-                progress_bar.progress((i + 1) / len(uploaded_files))
+                    document['content_hash'] = content_hash
+                    processed_docs.append(document)
+            
+            # Add to session state
+            add_session_documents(processed_docs)
+            log_activities([f"Uploaded document: {document['title']}" for document in processed_docs])
+            
+            # Add everything to the vector store so all chunks are embedded in one batch
+            if processed_docs:
+                status_text.text(f"Indexing {len(processed_docs)} documents...")
+                embeddings.add_documents(
+                    [document['content'] for document in processed_docs],
+                    [vector_metadata(document) for document in processed_docs]
+                )
+            
+            # Save all processed documents to the database in one transaction
+            saved = save_documents(processed_docs)
             
+            processed_count = len(processed_docs)
             status_text.text(f"✅ Processed {processed_count} documents successfully!")
             
             if processed_count > 0:
                 st.success(f"Added {processed_count} documents to your library!")
-                st.rerun()
+                # Stay on this run if saving failed so the error remains visible
+                if saved:
+                    st.rerun()
 
 with tab2:
     st.subheader("Search Academic Papers")
@@ -114,58 +153,55 @@ with tab2:
     
     if arxiv_query and st.button("🔍 Search Arxiv", type="primary"):
         with st.spinner("Searching Arxiv..."):
-            papers = search_arxiv_papers(arxiv_query, max_results)
+            # Kept in session state so the results survive the rerun triggered by the download button
+            st.session_state.arxiv_results = search_arxiv_papers(arxiv_query, max_results)
+        if not st.session_state.arxiv_results:
+            st.info("No papers found. Try different keywords.")
+    
+    papers = st.session_state.get('arxiv_results')
+    if papers:
+        st.success(f"Found {len(papers)} papers")
         
-        if papers:
-            st.success(f"Found {len(papers)} papers")
+        for paper in papers:
+            with st.expander(f"📄 {paper['title'][:100]}..."):
+                st.markdown(f"**Authors:** {', '.join(paper['authors'])}")
+                st.markdown(f"**Published:** {paper['published']}")
+                st.markdown(f"**Categories:** {', '.join(paper['categories'])}")
+                st.markdown(f"**Abstract:** {paper['abstract'][:300]}...")
+                st.link_button("🔗 View on Arxiv", paper['url'])
+        
+        selected = st.multiselect(
+            "Select papers to download",
+            options=range(len(papers)),
+            format_func=lambda i: papers[i]['title']
+        )
+        
+        if selected and st.button("📥 Download Selected", type="primary"):
+            with st.spinner(f"Downloading and processing {len(selected)} papers..."):
+                documents = download_arxiv_papers([papers[i]['url'] for i in selected])
+            downloaded = [document for document in documents if document]
             
-            for i, paper in enumerate(papers):
-                with st.expander(f"📄 {paper['title'][:100]}..."):
-                    st.markdown(f"**Authors:** {', '.join(paper['authors'])}")
-                    st.markdown(f"**Published:** {paper['published']}")
-                    st.markdown(f"**Categories:** {', '.join(paper['categories'])}")
-                    st.markdown(f"**Abstract:** {paper['abstract'][:300]}...")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button(f"📥 Download Paper", key=f"download_{i}"):
-                            with st.spinner("Downloading and processing..."):
-                                document = download_arxiv_paper(paper['url'])
-                            
-                            if document:
-                                # Add to session state
-                                st.session_state.documents.append(document)
-                                
-                                # Save to database
-                                from backend.database import Database
-                                if st.session_state.get('user_id'):
-                                    try:
-                                        db = Database()
-                                        db.save_document(st.session_state.user_id, document)
-                                    except:
-                                        pass
-                                
-                                # Add to vector store
-                                embeddings.add_document(
-                                    document['content'],
-                                    {
-                                        'document_id': document['id'],
-                                        'title': document['title'],
-                                        'type': document['type'],
-                                        'source': document['source']
-                                    }
-                                )
-                                
-                                log_activity(f"Downloaded paper: {document['title']}")
-                                st.success("Paper added to your library!")
-                                st.rerun()
-                            else:
-                                st.error("Failed to download paper")
-                    
-                    with col2:
-                        st.link_button("🔗 View on Arxiv", paper['url'])
-        else:
-            st.info("No papers found. Try different keywords.")
+            add_session_documents(downloaded)
+            
+            # Save to database
+            saved = save_documents(downloaded)
+            
+            if downloaded:
+                # Add to vector store in one batch
+                embeddings.add_documents(
+                    [document['content'] for document in downloaded],
+                    [vector_metadata(document) for document in downloaded]
+                )
+                
+                log_activities([f"Downloaded paper: {document['title']}" for document in downloaded])
+            
+            if len(downloaded) < len(selected):
+                st.error(f"Failed to download {len(selected) - len(downloaded)} of {len(selected)} papers")
+            if downloaded:
+                st.success(f"Added {len(downloaded)} papers to your library!")
+                st.session_state.arxiv_results = None
+                if saved and len(downloaded) == len(selected):
+                    st.rerun()
 
 with tab3:
     st.subheader("My Document Library")
@@ -178,7 +214,7 @@ with tab3:
         with col1:
             st.metric("📄 Total Documents", len(st.session_state.documents))
         with col2:
-            total_words = sum(doc.get('word_count', 0) for doc in st.session_state.documents)
+            total_words = st.session_state.total_words
             st.metric("📝 Total Words", f"{total_words:,}")
         with col3:
             reading_time = calculate_reading_time(total_words)
@@ -225,8 +261,7 @@ with tab3:
                         st.markdown(f"**Authors:** {', '.join(doc['authors'])}")
                     
                     # Content preview
-                    preview = doc['content'][:300]
-                    st.markdown(f"**Preview:** {preview}...")
+                    st.markdown(f"**Preview:** {document_preview(doc)}")
                 
                 with col2:
                     # Action buttons
@@ -242,16 +277,26 @@ with tab3:
                         if remove_document_by_id(doc['id']):
                             embeddings.remove_document(doc['id'])
                             # Delete from database
-                            from backend.database import Database
+                            from backend.database import get_db
                             if st.session_state.get('user_id'):
                                 try:
-                                    db = Database()
+                                    db = get_db()
                                     db.delete_document(st.session_state.user_id, doc['id'])
                                 except:
                                     pass
                             st.success("Document deleted!")
                             st.rerun()
 
+# Index library documents the vector store is missing (e.g. saved before it was reset) after the page has
+# rendered, so searches here and cross-references in Document Tools don't wait on it
+missing = [doc for doc in st.session_state.documents if not embeddings.has_document(doc['id'])]
+if missing and embeddings.client:
+    with st.sidebar, st.spinner(f"Indexing {len(missing)} documents..."):
+        embeddings.add_documents(
+            [document['content'] for document in missing],
+            [vector_metadata(document) for document in missing]
+        )
+
 # Vector store statistics
 with st.sidebar:
     st.subheader("📊 Library Stats")
@@ -1,8 +1,13 @@
 import streamlit as st
 from backend.auth import check_authentication, render_logout_button
-from backend.utils import initialize_session_state, log_activity, get_document_by_id
-from backend.orchestrator import AIOrchestrator
+from backend.utils import (
+    initialize_session_state, log_activity, get_document_by_id, get_document_options,
+    get_document_titles, get_document_positions, record_quiz_result, average_quiz_score
+)
+from backend.orchestrator import get_orchestrator
+from backend.embeddings import get_embeddings
 from datetime import datetime
+from itertools import islice
 import json
 
 # Page configuration
@@ -24,10 +29,6 @@ initialize_session_state()
 render_logout_button()
 
 # Initialize AI orchestrator
-@st.cache_resource
-def get_orchestrator():
-    return AIOrchestrator()
-
 try:
     orchestrator = get_orchestrator()
 except ValueError as e:
@@ -46,6 +47,221 @@ if not st.session_state.documents:
         st.switch_page("pages/1_📚_Document_Library.py")
     st.stop()
 
+# Document picker options, shared by the quiz tabs
+doc_options = get_document_options()
+doc_positions = get_document_positions()
+doc_titles = get_document_titles()
+
+@st.fragment
+def render_mcq_quiz(quiz):
+    """Render a multiple choice quiz; answering a question reruns only this fragment"""
+    # Clearing current_quiz doesn't remove the fragment, so a later fragment rerun would show a submitted quiz again
+    if quiz.get('submitted'):
+        return
+    
+    st.markdown("---")
+    st.subheader(f"Quiz: {quiz['document_title']}")
+    
+    all_answered = True
+    
+    for i, question in enumerate(quiz['questions']):
+        st.markdown(f"**Question {i+1}:** {question['question']}")
+        
+        answer = st.radio(
+            "Choose your answer:",
+            options=list(question['options'].keys()),
+            format_func=lambda x: f"{x}: {question['options'][x]}",
+            key=f"mcq_{i}",
+            index=None
+        )
+        
+        if answer:
+            quiz['answers'][i] = answer
+        else:
+            all_answered = False
+        
+        st.markdown("---")
+    
+    # Submit quiz
+    if all_answered:
+        if st.button("✅ Submit Quiz", type="primary"):
+            # Calculate score
+            correct_count = 0
+            total_questions = len(quiz['questions'])
+            
+            for i, question in enumerate(quiz['questions']):
+                if quiz['answers'].get(i) == question['correct_answer']:
+                    correct_count += 1
+            
+            score = (correct_count / total_questions) * 100
+            
+            # Show results
+            st.success(f"Quiz completed! Score: {score:.1f}% ({correct_count}/{total_questions})")
+            
+            # Show detailed feedback
+            st.subheader("📋 Detailed Results")
+            for i, question in enumerate(quiz['questions']):
+                user_answer = quiz['answers'].get(i)
+                is_correct = user_answer == question['correct_answer']
+                
+                status_icon = "✅" if is_correct else "❌"
+                st.markdown(f"{status_icon} **Question {i+1}:** {question['question']}")
+                
+                if not is_correct:
+                    st.markdown(f"Your answer: **{user_answer}** - {question['options'][user_answer]}")
+                    st.markdown(f"Correct answer: **{question['correct_answer']}** - {question['options'][question['correct_answer']]}")
+                
+                st.markdown(f"*Explanation:* {question['explanation']}")
+                
+                if question.get('reference'):
+                    st.markdown(f"*Reference:* {question['reference']}")
+                
+                st.markdown("---")
+            
+            # Save to history
+            quiz_result = {
+                'id': f"quiz_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                'type': 'multiple_choice',
+                'document_id': quiz['document_id'],
+                'document_title': quiz['document_title'],
+                'score': score,
+                'total_questions': total_questions,
+                'correct_answers': correct_count,
+                'completed_at': datetime.now().isoformat(),
+                'difficulty': quiz.get('difficulty', 'Medium'),
+                'time_taken': 'Not tracked'  # Could implement timer
+            }
+            quiz['submitted'] = True
+            record_quiz_result(quiz_result)
+            
+            log_activity(f"Completed MCQ quiz on {quiz['document_title']} - Score: {score:.1f}%")
+            
+            # Clear current quiz
+            st.session_state.current_quiz = None
+            
+            st.balloons()
+
+@st.fragment
+def render_completion_exercise(completion):
+    """Render a sentence completion exercise; typing an answer reruns only this fragment"""
+    # As with quizzes, a fragment rerun after submitting must not bring the exercise back
+    if completion.get('submitted'):
+        return
+    
+    st.markdown("---")
+    st.subheader(f"Completion Exercise: {completion['document_title']}")
+    
+    for i, exercise in enumerate(completion['exercises']):
+        st.markdown(f"**Exercise {i+1}:**")
+        st.markdown(f"{exercise['sentence']}")
+        
+        if exercise.get('hint'):
+            with st.expander("💡 Hint"):
+                st.info(exercise['hint'])
+        
+        answer = st.text_input(
+            "Your answer:",
+            key=f"completion_{i}",
+            placeholder="Type your answer here..."
+        )
+        
+        if answer:
+            completion['answers'][i] = answer
+        
+        st.markdown("---")
+    
+    # Submit exercises
+    if len(completion['answers']) == len(completion['exercises']):
+        if st.button("✅ Submit Exercises", type="primary"):
+            # Evaluate all answers in a single request
+            with st.spinner("Evaluating your answers..."):
+                results = orchestrator.evaluate_answers_batch([
+                    {
+                        'question': f"Complete: {exercise['sentence']}",
+                        'correct_answer': exercise['correct_answer'],
+                        'user_answer': completion['answers'].get(i, "")
+                    }
+                    for i, exercise in enumerate(completion['exercises'])
+                ])
+            total_score = sum(evaluation['score'] for evaluation in results)
+            
+            avg_score = total_score / len(completion['exercises'])
+            
+            # Show results
+            st.success(f"Exercises completed! Average Score: {avg_score:.1f}%")
+            
+            st.subheader("📋 Detailed Feedback")
+            for i, (exercise, result) in enumerate(zip(completion['exercises'], results)):
+                status_icon = "✅" if result['is_correct'] else "❌"
+                st.markdown(f"{status_icon} **Exercise {i+1}:** Score: {result['score']:.1f}%")
+                st.markdown(f"Sentence: {exercise['sentence']}")
+                st.markdown(f"Your answer: **{completion['answers'][i]}**")
+                st.markdown(f"Expected answer: **{exercise['correct_answer']}**")
+                st.markdown(f"Feedback: {result['feedback']}")
+                st.markdown("---")
+            
+            # Save to history
+            quiz_result = {
+                'id': f"completion_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                'type': 'sentence_completion',
+                'document_id': completion['document_id'],
+                'document_title': completion['document_title'],
+                'score': avg_score,
+                'total_questions': len(completion['exercises']),
+                'completed_at': datetime.now().isoformat()
+            }
+            completion['submitted'] = True
+            record_quiz_result(quiz_result)
+            
+            log_activity(f"Completed sentence completion on {completion['document_title']} - Score: {avg_score:.1f}%")
+            
+            # Clear current exercise
+            st.session_state.current_completion = None
+
+@st.fragment
+def render_qa_exercise(qa):
+    """Answer box and evaluation for a Q&A exercise; reruns here don't regenerate the reference answer"""
+    st.subheader("✍️ Your Turn")
+    user_answer = st.text_area(
+        "Provide your answer to the question:",
+        height=150,
+        placeholder="Write your answer here..."
+    )
+    
+    if user_answer and st.button("🔍 Evaluate My Answer"):
+        with st.spinner("Evaluating your answer..."):
+            evaluation = orchestrator.evaluate_answer(
+                qa['question'],
+                qa['reference_answer'],
+                user_answer
+            )
+        
+        # Show evaluation
+        score_color = "green" if evaluation['score'] >= 70 else "orange" if evaluation['score'] >= 50 else "red"
+        
+        st.markdown(f"### 📊 Evaluation Result")
+        st.markdown(f"**Score:** :{score_color}[{evaluation['score']:.1f}%]")
+        st.markdown(f"**Status:** {'✅ Correct' if evaluation['is_correct'] else '❌ Needs Improvement'}")
+        
+        st.markdown("**Feedback:**")
+        st.info(evaluation['feedback'])
+        
+        # Save to history
+        qa_result = {
+            'id': f"qa_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'type': 'qa_exercise',
+            'document_id': qa['document_id'],
+            'document_title': qa['document_title'],
+            'question': qa['question'],
+            'user_answer': user_answer,
+            'reference_answer': qa['reference_answer'],
+            'score': evaluation['score'],
+            'completed_at': datetime.now().isoformat()
+        }
+        record_quiz_result(qa_result)
+        
+        log_activity(f"Completed Q&A exercise on {qa['document_title']} - Score: {evaluation['score']:.1f}%")
+
 # Tabs for different quiz modes
 tab1, tab2, tab3, tab4 = st.tabs(["🎯 Multiple Choice", "✍️ Sentence Completion", "💬 Q&A Exercise", "📈 Quiz History"])
 
@@ -53,11 +269,10 @@ with tab1:
     st.subheader("Multiple Choice Quiz")
     
     # Document selection
-    doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
     selected_title = st.selectbox(
         "Select Document",
-        options=list(doc_options.keys()),
-        index=list(doc_options.values()).index(selected_doc_id) if selected_doc_id in doc_options.values() else 0
+        options=doc_titles,
+        index=doc_positions.get(selected_doc_id, 0)
     )
     selected_doc = get_document_by_id(doc_options[selected_title])
     
@@ -92,105 +307,15 @@ with tab1:
     
     # Display current quiz
     if st.session_state.current_quiz and st.session_state.current_quiz['type'] == 'multiple_choice':
-        quiz = st.session_state.current_quiz
-        st.markdown("---")
-        st.subheader(f"Quiz: {quiz['document_title']}")
-        
-        all_answered = True
-        
-        for i, question in enumerate(quiz['questions']):
-            st.markdown(f"**Question {i+1}:** {question['question']}")
-            
-            answer = st.radio(
-                "Choose your answer:",
-                options=list(question['options'].keys()),
-                format_func=lambda x: f"{x}: {question['options'][x]}",
-                key=f"mcq_{i}",
-                index=None
-            )
-            
-            if answer:
-                quiz['answers'][i] = answer
-            else:
-                all_answered = False
-            
-            st.markdown("---")
-        
-        # Submit quiz
-        if all_answered:
-            if st.button("✅ Submit Quiz", type="primary"):
-                # Calculate score
-                correct_count = 0
-                total_questions = len(quiz['questions'])
-                
-                for i, question in enumerate(quiz['questions']):
-                    if quiz['answers'].get(i) == question['correct_answer']:
-                        correct_count += 1
-                
-                score = (correct_count / total_questions) * 100
-                
-                # Show results
-                st.success(f"Quiz completed! Score: {score:.1f}% ({correct_count}/{total_questions})")
-                
-                # Show detailed feedback
-                st.subheader("📋 Detailed Results")
-                for i, question in enumerate(quiz['questions']):
-                    user_answer = quiz['answers'].get(i)
-                    is_correct = user_answer == question['correct_answer']
-                    
-                    status_icon = "✅" if is_correct else "❌"
-                    st.markdown(f"{status_icon} **Question {i+1}:** {question['question']}")
-                    
-                    if not is_correct:
-                        st.markdown(f"Your answer: **{user_answer}** - {question['options'][user_answer]}")
-                        st.markdown(f"Correct answer: **{question['correct_answer']}** - {question['options'][question['correct_answer']]}")
-                    
-                    st.markdown(f"*Explanation:* {question['explanation']}")
-                    
-                    if question.get('reference'):
-                        st.markdown(f"*Reference:* {question['reference']}")
-                    
-                    st.markdown("---")
-                
-                # Save to history
-                quiz_result = {
-                    'id': f"quiz_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                    'type': 'multiple_choice',
-                    'document_id': quiz['document_id'],
-                    'document_title': quiz['document_title'],
-                    'score': score,
-                    'total_questions': total_questions,
-                    'correct_answers': correct_count,
-                    'completed_at': datetime.now().isoformat(),
-                    'difficulty': quiz.get('difficulty', 'Medium'),
-                    'time_taken': 'Not tracked'  # Could implement timer
-                }
-                st.session_state.quiz_history.append(quiz_result)
-                
-                # Save to database
-                from backend.database import Database
-                if st.session_state.get('user_id'):
-                    try:
-                        db = Database()
-                        db.save_quiz_result(st.session_state.user_id, quiz_result)
-                    except:
-                        pass
-                
-                log_activity(f"Completed MCQ quiz on {quiz['document_title']} - Score: {score:.1f}%")
-                
-                # Clear current quiz
-                st.session_state.current_quiz = None
-                
-                st.balloons()
+        render_mcq_quiz(st.session_state.current_quiz)
 
 with tab2:
     st.subheader("Sentence Completion Exercise")
     
     # Document selection
-    doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
     selected_title = st.selectbox(
         "Select Document",
-        options=list(doc_options.keys()),
+        options=doc_titles,
         key="completion_doc"
     )
     selected_doc = get_document_by_id(doc_options[selected_title])
@@ -220,96 +345,16 @@ with tab2:
     
     # Display exercises
     if st.session_state.get('current_completion'):
-        completion = st.session_state.current_completion
-        st.markdown("---")
-        st.subheader(f"Completion Exercise: {completion['document_title']}")
-        
-        for i, exercise in enumerate(completion['exercises']):
-            st.markdown(f"**Exercise {i+1}:**")
-            st.markdown(f"{exercise['sentence']}")
-            
-            if exercise.get('hint'):
-                with st.expander("💡 Hint"):
-                    st.info(exercise['hint'])
-            
-            answer = st.text_input(
-                "Your answer:",
-                key=f"completion_{i}",
-                placeholder="Type your answer here..."
-            )
-            
-            if answer:
-                completion['answers'][i] = answer
-            
-            st.markdown("---")
-        
-        # Submit exercises
-        if len(completion['answers']) == len(completion['exercises']):
-            if st.button("✅ Submit Exercises", type="primary"):
-                # Evaluate answers
-                results = []
-                total_score = 0
-                
-                for i, exercise in enumerate(completion['exercises']):
-                    user_answer = completion['answers'].get(i, "")
-                    evaluation = orchestrator.evaluate_answer(
-                        f"Complete: {exercise['sentence']}",
-                        exercise['correct_answer'],
-                        user_answer
-                    )
-                    results.append(evaluation)
-                    total_score += evaluation['score']
-                
-                avg_score = total_score / len(completion['exercises'])
-                
-                # Show results
-                st.success(f"Exercises completed! Average Score: {avg_score:.1f}%")
-                
-                st.subheader("📋 Detailed Feedback")
-                for i, (exercise, result) in enumerate(zip(completion['exercises'], results)):
-                    status_icon = "✅" if result['is_correct'] else "❌"
-                    st.markdown(f"{status_icon} **Exercise {i+1}:** Score: {result['score']:.1f}%")
-                    st.markdown(f"Sentence: {exercise['sentence']}")
-                    st.markdown(f"Your answer: **{completion['answers'][i]}**")
-                    st.markdown(f"Expected answer: **{exercise['correct_answer']}**")
-                    st.markdown(f"Feedback: {result['feedback']}")
-                    st.markdown("---")
-                
-                # Save to history
-                quiz_result = {
-                    'id': f"completion_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                    'type': 'sentence_completion',
-                    'document_id': completion['document_id'],
-                    'document_title': completion['document_title'],
-                    'score': avg_score,
-                    'total_questions': len(completion['exercises']),
-                    'completed_at': datetime.now().isoformat()
-                }
-                st.session_state.quiz_history.append(quiz_result)
-                
-                # Save to database
-                from backend.database import Database
-                if st.session_state.get('user_id'):
-                    try:
-                        db = Database()
-                        db.save_quiz_result(st.session_state.user_id, quiz_result)
-                    except:
-                        pass
-                
-                log_activity(f"Completed sentence completion on {completion['document_title']} - Score: {avg_score:.1f}%")
-                
-                # Clear current exercise
-                st.session_state.current_completion = None
+        render_completion_exercise(st.session_state.current_completion)
 
 with tab3:
     st.subheader("Q&A Exercise")
     st.markdown("Generate questions and evaluate your understanding")
     
     # Document selection
-    doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
     selected_title = st.selectbox(
         "Select Document",
-        options=list(doc_options.keys()),
+        options=doc_titles,
         key="qa_doc"
     )
     selected_doc = get_document_by_id(doc_options[selected_title])
@@ -323,78 +368,35 @@ with tab3:
     
     if user_question and st.button("📝 Generate Answer & Evaluate", type="primary"):
         with st.spinner("Generating reference answer..."):
-            # Generate reference answer
-            reference_prompt = f"""
-            Based on the following document, provide a comprehensive answer to this question: {user_question}
-            
-            Document content:
-            {selected_doc['content'][:3000]}...
-            
-            Provide a detailed, accurate answer based only on the document content.
-            """
+            # Use the chunks of this document most relevant to the question as context,
+            # falling back to its opening if the document isn't in the vector store
+            chunks = get_embeddings().search(user_question, k=5, filter={'document_id': selected_doc['id']})
+            if chunks:
+                context = "\n\n".join(chunk['text'] for chunk in chunks)
+            else:
+                context = f"{selected_doc['content'][:3000]}..."
             
             try:
-                response = orchestrator.client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=reference_prompt
-                )
-                reference_answer = response.text
-                
                 st.subheader("📖 Reference Answer")
-                st.markdown(reference_answer)
-                
-                st.subheader("✍️ Your Turn")
-                user_answer = st.text_area(
-                    "Provide your answer to the question:",
-                    height=150,
-                    placeholder="Write your answer here..."
-                )
-                
-                if user_answer and st.button("🔍 Evaluate My Answer"):
-                    with st.spinner("Evaluating your answer..."):
-                        evaluation = orchestrator.evaluate_answer(
-                            user_question,
-                            reference_answer,
-                            user_answer
-                        )
-                    
-                    # Show evaluation
-                    score_color = "green" if evaluation['score'] >= 70 else "orange" if evaluation['score'] >= 50 else "red"
-                    
-                    st.markdown(f"### 📊 Evaluation Result")
-                    st.markdown(f"**Score:** :{score_color}[{evaluation['score']:.1f}%]")
-                    st.markdown(f"**Status:** {'✅ Correct' if evaluation['is_correct'] else '❌ Needs Improvement'}")
-                    
-                    st.markdown("**Feedback:**")
-                    st.info(evaluation['feedback'])
-                    
-                    # Save to history
-                    qa_result = {
-                        'id': f"qa_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                        'type': 'qa_exercise',
-                        'document_id': selected_doc['id'],
-                        'document_title': selected_doc['title'],
-                        'question': user_question,
-                        'user_answer': user_answer,
-                        'reference_answer': reference_answer,
-                        'score': evaluation['score'],
-                        'completed_at': datetime.now().isoformat()
-                    }
-                    st.session_state.quiz_history.append(qa_result)
-                    
-                    # Save to database
-                    from backend.database import Database
-                    if st.session_state.get('user_id'):
-                        try:
-                            db = Database()
-                            db.save_quiz_result(st.session_state.user_id, qa_result)
-                        except:
-                            pass
-                    
-                    log_activity(f"Completed Q&A exercise on {selected_doc['title']} - Score: {evaluation['score']:.1f}%")
-                
+                # Stream the answer so it renders as it is generated; write_stream returns the full text
+                reference_answer = st.write_stream(orchestrator.answer_question_stream(user_question, context))
+                # Kept so answering and evaluating below doesn't regenerate it
+                st.session_state.current_qa = {
+                    'document_id': selected_doc['id'],
+                    'document_title': selected_doc['title'],
+                    'question': user_question,
+                    'reference_answer': reference_answer
+                }
             except Exception as e:
                 st.error(f"Error generating reference answer: {e}")
+                st.session_state.current_qa = None
+    elif st.session_state.get('current_qa'):
+        st.subheader("📖 Reference Answer")
+        st.markdown(st.session_state.current_qa['reference_answer'])
+    
+    # Answer and evaluation
+    if st.session_state.get('current_qa'):
+        render_qa_exercise(st.session_state.current_qa)
 
 with tab4:
     st.subheader("📈 Quiz History")
@@ -403,8 +405,8 @@ with tab4:
         st.info("No quiz history yet. Complete some quizzes to see your progress!")
     else:
         # Summary stats
-        total_quizzes = len(st.session_state.quiz_history)
-        avg_score = sum(q.get('score', 0) for q in st.session_state.quiz_history) / total_quizzes
+        total_quizzes = st.session_state.quiz_stats['count']
+        avg_score = average_quiz_score()
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -437,7 +439,7 @@ with tab4:
         st.markdown("---")
         
         # Quiz history table
-        for quiz in reversed(st.session_state.quiz_history[-10:]):  # Show last 10
+        for quiz in islice(reversed(st.session_state.quiz_history), 10):  # Show last 10
             quiz_type_icons = {
                 'multiple_choice': '🎯',
                 'sentence_completion': '✍️',
@@ -1,8 +1,17 @@
 import streamlit as st
 from backend.auth import check_authentication, render_logout_button
-from backend.utils import initialize_session_state, log_activity, get_document_by_id
-from backend.orchestrator import AIOrchestrator
+from backend.utils import (
+    initialize_session_state, log_activity, get_document_by_id, get_document_options,
+    get_document_titles, get_document_positions, document_fingerprint, add_session_summary, remove_summary_by_id
+)
+from backend.orchestrator import get_orchestrator
+from backend.semantic_cache import get_summary_cache
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
+import logging
+import threading
 import uuid
 
 # Page configuration
@@ -24,16 +33,71 @@ initialize_session_state()
 render_logout_button()
 
 # Initialize AI orchestrator
-@st.cache_resource
-def get_orchestrator():
-    return AIOrchestrator()
-
 try:
     orchestrator = get_orchestrator()
 except ValueError as e:
     st.error(f"AI Service Error: {e}")
     st.stop()
 
+SUMMARIES_PER_PAGE = 20  # Expanders rendered per page of the Summary Library
+
+# Memoized on the document fingerprint rather than its text, and raises so failures aren't cached
+@st.cache_data(ttl=24 * 60 * 60, max_entries=256, show_spinner=False)
+def key_concepts_for(doc_id: str, content_digest: str, _content: str) -> list:
+    """Key concepts for a document; they depend only on its content, so every summary style shares them"""
+    concepts = get_orchestrator().extract_key_concepts(_content)
+    if not concepts:
+        raise RuntimeError("No key concepts extracted")
+    return concepts
+
+def stream_summary_parts(document, parts: list):
+    """Stream the summary into the page while key concepts are generated alongside it"""
+    content_digest = document_fingerprint(document)
+    ctx = get_script_run_ctx()
+    
+    def concepts_task():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            return key_concepts_for(document['id'], content_digest, document['content'])
+        except Exception:
+            return []
+    
+    placeholder = st.empty()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        concepts = executor.submit(concepts_task) if 'key_concepts' in parts else None
+        try:
+            with placeholder.container():
+                summary_text = st.write_stream(orchestrator.generate_summary_stream(document['content'], document['title']))
+        except Exception as e:
+            logging.error(f"Summary streaming failed: {e}")
+            summary_text = None
+        placeholder.empty()
+        
+        if not summary_text:
+            # Fall back to the blocking call; repeats of either call are answered by the LLM cache
+            summary_text = orchestrator.generate_summary(document['content'], document['title'])
+        generated = {'summary': summary_text}
+        if concepts:
+            generated['key_concepts'] = concepts.result()
+        return generated
+
+def similarity_text(content: str, size: int = 4000) -> str:
+    """Excerpts from the start, middle and end of a document, so revisions past the opening still change its embedding"""
+    if len(content) <= size:
+        return content
+    part = size // 3
+    middle = (len(content) - part) // 2
+    return "\n".join([content[:part], content[middle:middle + part], content[-part:]])
+
+def summary_markdown(summary) -> bytes:
+    """Markdown download payload for a summary, built once and kept on the record"""
+    if '_markdown' not in summary:
+        summary['_markdown'] = (
+            f"# {summary['document_title']}\n\n## Summary\n\n{summary['summary']}\n\n"
+            f"## Key Concepts\n\n{', '.join(summary.get('key_concepts') or [])}"
+        ).encode('utf-8')
+    return summary['_markdown']
+
 st.title("📝 Document Summaries")
 st.markdown("Generate AI-powered summaries of your documents with markdown formatting.")
 
@@ -53,18 +117,14 @@ with tab1:
     st.subheader("Generate New Summary")
     
     # Document selection
-    doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
+    doc_options = get_document_options()
     
     # Pre-select document if coming from library
-    default_index = 0
-    if selected_doc_id and selected_doc_id in doc_options.values():
-        doc_titles = list(doc_options.keys())
-        doc_ids = list(doc_options.values())
-        default_index = doc_ids.index(selected_doc_id)
+    default_index = get_document_positions().get(selected_doc_id, 0)
     
     selected_title = st.selectbox(
         "Select Document to Summarize",
-        options=list(doc_options.keys()),
+        options=get_document_titles(),
         index=default_index,
         help="Choose a document from your library to generate a summary"
     )
@@ -119,17 +179,45 @@ with tab1:
                     
                     style_instruction = style_prompts.get(summary_style, "Create a comprehensive summary")
                     
-                    # Generate the summary
-                    summary_text = orchestrator.generate_summary(
-                        selected_doc['content'],
-                        selected_doc['title']
-                    )
+                    # Generate the summary and, if requested, key concepts at the same time
+                    parts = ['summary', 'key_concepts'] if include_concepts else ['summary']
+                    
+                    # Near-duplicates of the user's own documents (the same paper under another filename)
+                    # reuse an earlier summary: one embedding call instead of a generation call. The cache is
+                    # shared by every session, so entries only match the user they came from. An identical
+                    # document is already answered by the LLM cache, so only a miss there pays for the embedding.
+                    summary_cache = get_summary_cache()
+                    owner = st.session_state.get('user_id')
+                    query_vector = None
+                    cached = None
+                    if owner and not orchestrator.has_cached_summary(selected_doc['content'], selected_doc['title']):
+                        try:
+                            query_vector = orchestrator.embed(similarity_text(selected_doc['content']))
+                        except:
+                            query_vector = None
+                    if query_vector is not None:
+                        cached = summary_cache.lookup(
+                            query_vector,
+                            accept=lambda entry: (
+                                entry['owner'] == owner and entry['style'] == summary_style
+                                and all(part in entry for part in parts)
+                            )
+                        )
+                    
+                    if cached is not None:
+                        generated = {part: cached[part] for part in parts}
+                    else:
+                        generated = stream_summary_parts(selected_doc, parts)
+                        # Only complete results are stored; a failed summary or concept extraction is retried next time
+                        complete = "Error" not in (generated['summary'] or "Error") and (
+                            'key_concepts' not in parts or generated.get('key_concepts')
+                        )
+                        if query_vector is not None and complete:
+                            summary_cache.add(query_vector, {'owner': owner, 'style': summary_style, **generated})
+                    summary_text = generated['summary']
                     
                     if summary_text and "Error" not in summary_text:
-                        # Extract key concepts if requested
-                        key_concepts = []
-                        if include_concepts:
-                            key_concepts = orchestrator.extract_key_concepts(selected_doc['content'])
+                        key_concepts = generated.get('key_concepts', [])
                         
                         # Create summary record
                         summary_record = {
@@ -144,14 +232,13 @@ with tab1:
                         }
                         
                         # Add to session state
-                        st.session_state.summaries.append(summary_record)
+                        add_session_summary(summary_record)
                         
-                        # Save to database
-                        from backend.database import Database
+                        # Queue the database write; the background writer commits it
+                        from backend.database import get_writer
                         if st.session_state.get('user_id'):
                             try:
-                                db = Database()
-                                db.save_summary(st.session_state.user_id, summary_record)
+                                get_writer().enqueue(("save_summary", st.session_state.user_id, summary_record))
                             except:
                                 pass
                         
@@ -188,7 +275,7 @@ with tab1:
                         # Download option
                         st.download_button(
                             "💾 Download Summary",
-                            data=f"# {selected_doc['title']}\n\n## Summary\n\n{summary_text}\n\n## Key Concepts\n\n{', '.join(key_concepts)}",
+                            data=summary_markdown(summary_record),
                             file_name=f"summary_{selected_doc['title'][:30]}.md",
                             mime="text/markdown",
                             help="Download summary as markdown file"
@@ -207,12 +294,12 @@ with tab1:
 with tab2:
     st.subheader("Summary Library")
     
-    if not st.session_state.summaries:
+    if not st.session_state.summaries_by_id:
         st.info("No summaries generated yet. Create your first summary using the 'Generate Summary' tab!")
     else:
         # Summary statistics
-        total_summaries = len(st.session_state.summaries)
-        total_summary_words = sum(s.get('word_count', 0) for s in st.session_state.summaries)
+        total_summaries = len(st.session_state.summaries_by_id)
+        total_summary_words = st.session_state.summary_words
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -225,24 +312,44 @@ with tab2:
         
         st.markdown("---")
         
+        def reset_summary_page():
+            """Start a new search on the first page of results"""
+            st.session_state.summary_page = 1
+        
         # Search summaries
         search_term = st.text_input(
             "🔍 Search Summaries",
             placeholder="Search by document title or content...",
-            help="Search through your summary library"
+            help="Search through your summary library",
+            on_change=reset_summary_page
         )
         
         # Filter summaries
-        filtered_summaries = st.session_state.summaries
+        filtered_summaries = st.session_state.summaries_by_id.values()
         if search_term:
+            term = search_term.lower()
             filtered_summaries = [
-                s for s in st.session_state.summaries
-                if search_term.lower() in s['document_title'].lower() or 
-                   search_term.lower() in s['summary'].lower()
+                s for s in st.session_state.summaries_by_id.values()
+                if term in s['_title_lc'] or term in s['_summary_lc']
             ]
         
+        # Paginate so only one page of expanders is built per rerun
+        page_count = max(1, -(-len(filtered_summaries) // SUMMARIES_PER_PAGE))
+        if st.session_state.get('summary_page', 1) > page_count:
+            # The filter or a delete left fewer pages than the one selected
+            st.session_state.summary_page = page_count
+        page = 1
+        if page_count > 1:
+            # Keyed state is the only source of the value, so the clamp above doesn't conflict with a default
+            page = st.number_input("Page", min_value=1, max_value=page_count, key='summary_page')
+            st.caption(
+                f"Showing {(page - 1) * SUMMARIES_PER_PAGE + 1}-{min(page * SUMMARIES_PER_PAGE, len(filtered_summaries))} "
+                f"of {len(filtered_summaries)} summaries"
+            )
+        
         # Display summaries
-        for summary in reversed(filtered_summaries):  # Most recent first
+        page_summaries = islice(reversed(filtered_summaries), (page - 1) * SUMMARIES_PER_PAGE, page * SUMMARIES_PER_PAGE)
+        for summary in page_summaries:  # Most recent first
             with st.expander(f"📄 {summary['document_title']} - {summary['created_at'][:10]}"):
                 # Summary metadata
                 col1, col2, col3, col4 = st.columns(4)
@@ -271,7 +378,7 @@ with tab2:
                     # Download button
                     st.download_button(
                         "💾 Download",
-                        data=f"# {summary['document_title']}\n\n## Summary\n\n{summary['summary']}\n\n## Key Concepts\n\n{', '.join(summary.get('key_concepts', []))}",
+                        data=summary_markdown(summary),
                         file_name=f"summary_{summary['document_title'][:30]}.md",
                         mime="text/markdown",
                         key=f"download_{summary['id']}"
@@ -292,13 +399,12 @@ with tab2:
                     # Delete summary
                     if st.button("🗑️ Delete", key=f"delete_{summary['id']}", type="secondary"):
                         # Remove from summaries
-                        st.session_state.summaries = [s for s in st.session_state.summaries if s['id'] != summary['id']]
+                        remove_summary_by_id(summary['id'])
                         # Delete from database
-                        from backend.database import Database
+                        from backend.database import get_writer
                         if st.session_state.get('user_id'):
                             try:
-                                db = Database()
-                                db.delete_summary(st.session_state.user_id, summary['id'])
+                                get_writer().enqueue(("delete_summary", st.session_state.user_id, summary['id']))
                             except:
                                 pass
                         log_activity(f"Deleted summary for: {summary['document_title']}")
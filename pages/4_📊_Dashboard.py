@@ -2,10 +2,10 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 from backend.auth import check_authentication, render_logout_button
-from backend.utils import initialize_session_state
+from backend.utils import initialize_session_state, average_quiz_score
 
 # Page configuration
 st.set_page_config(
@@ -29,65 +29,150 @@ st.title("📊 Learning Dashboard")
 st.markdown("Track your learning progress and performance metrics.")
 
 # Helper functions
-def get_date_from_iso(iso_string):
-    """Convert ISO string to date"""
-    try:
-        return datetime.fromisoformat(iso_string.replace('Z', '+00:00')).date()
-    except:
-        return datetime.now().date()
-
-def calculate_performance_metrics():
-    """Calculate performance metrics from quiz history"""
-    if not st.session_state.quiz_history:
+@st.cache_data(max_entries=64, show_spinner=False)
+def quiz_completion_dates(user_id: str, quiz_count: int, _history):
+    """Completion day of each quiz as a datetime64[D] array (NaT if missing); keyed like calculate_performance_metrics"""
+    completed = pd.Series([q.get('completed_at') or '' for q in _history], dtype=object)
+    return pd.to_datetime(completed.str[:10], format='%Y-%m-%d', errors='coerce').to_numpy(dtype='datetime64[D]')
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def calculate_performance_metrics(user_id: str, quiz_count: int, _history):
+    """Calculate performance metrics from quiz history; keyed on the quiz count rather than hashing the history"""
+    if not _history:
         return {}
     
+    # One pass over the history; everything else runs on the arrays
+    scores = np.fromiter((q.get('score', 0) for q in _history), dtype=np.float64, count=len(_history))
+    types = np.array([q.get('type', 'unknown') for q in _history])
+    
     metrics = {
-        'total_quizzes': len(st.session_state.quiz_history),
-        'average_score': sum(q.get('score', 0) for q in st.session_state.quiz_history) / len(st.session_state.quiz_history),
-        'best_score': max(q.get('score', 0) for q in st.session_state.quiz_history),
-        'recent_score': st.session_state.quiz_history[-1].get('score', 0) if st.session_state.quiz_history else 0
+        'scores': scores,
+        'best_score': float(scores.max()),
+        'recent_score': float(scores[-1])
     }
     
     # Quiz type breakdown
-    type_counts = defaultdict(int)
-    type_scores = defaultdict(list)
+    type_names, type_ids = np.unique(types, return_inverse=True)
+    type_counts = np.bincount(type_ids)
+    type_totals = np.bincount(type_ids, weights=scores)
     
-    for quiz in st.session_state.quiz_history:
-        quiz_type = quiz.get('type', 'unknown')
-        type_counts[quiz_type] += 1
-        type_scores[quiz_type].append(quiz.get('score', 0))
-    
-    metrics['type_breakdown'] = dict(type_counts)
-    metrics['type_averages'] = {k: sum(v) / len(v) for k, v in type_scores.items()}
+    metrics['type_breakdown'] = dict(zip(type_names.tolist(), type_counts.tolist()))
+    metrics['type_averages'] = dict(zip(type_names.tolist(), (type_totals / type_counts).tolist()))
     
     return metrics
 
-def generate_activity_calendar():
-    """Generate activity calendar data"""
-    activity_data = defaultdict(int)
-    
-    # Count activities by date
-    for activity in st.session_state.activity_log:
-        try:
-            date = datetime.fromisoformat(activity['timestamp'].replace('Z', '+00:00')).date()
-            activity_data[date] += 1
-        except:
-            continue
+@st.cache_data(ttl=300, show_spinner=False)
+def generate_activity_calendar(timestamps: tuple, today):
+    """Generate activity calendar data for the 90 days up to today"""
+    # ISO timestamps start with their date; unparseable ones become NaT and are not counted
+    days = pd.to_datetime(pd.Series(timestamps, dtype=object).str[:10], format='%Y-%m-%d', errors='coerce')
+    activity_data = days.dropna().dt.date.value_counts()
     
     # Generate last 90 days
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=89)
+    dates = list(pd.date_range(end=today, periods=90, freq='D').date)
+    activities = activity_data.reindex(dates, fill_value=0).tolist()
+    
+    return dates, activities
+
+# Figures are cached with the same keys as the data behind them, so reruns reuse the built objects
+@st.cache_data(max_entries=64, show_spinner=False)
+def score_trend_figure(user_id: str, quiz_count: int, _scores):
+    """Line chart of quiz scores, using the quiz number as x-axis"""
+    fig = px.line(
+        x=np.arange(1, len(_scores) + 1),
+        y=_scores,
+        title="Quiz Score Progression",
+        labels={'x': 'Quiz Number', 'y': 'Score (%)'},
+        markers=True
+    )
     
-    dates = []
-    activities = []
+    # Add target line at 80%
+    fig.add_hline(y=80, line_dash="dash", line_color="green", 
+                 annotation_text="Target: 80%")
     
-    current_date = start_date
-    while current_date <= end_date:
-        dates.append(current_date)
-        activities.append(activity_data.get(current_date, 0))
-        current_date += timedelta(days=1)
+    fig.update_layout(
+        showlegend=False,
+        height=300,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    return fig
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def quiz_type_figures(user_id: str, quiz_count: int, _metrics):
+    """Quiz type distribution pie and average-score-by-type bar charts"""
+    type_labels = [t.replace('_', ' ').title() for t in _metrics['type_breakdown'].keys()]
+    
+    fig_pie = px.pie(
+        values=list(_metrics['type_breakdown'].values()),
+        names=type_labels,
+        title="Quiz Type Distribution"
+    )
+    fig_pie.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
     
-    return dates, activities
+    fig_bar = px.bar(
+        x=type_labels,
+        y=list(_metrics['type_averages'].values()),
+        title="Average Score by Quiz Type",
+        labels={'x': 'Quiz Type', 'y': 'Average Score (%)'}
+    )
+    fig_bar.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
+    return fig_pie, fig_bar
+
+@st.cache_data(ttl=300, show_spinner=False)
+def activity_heatmap_figure(timestamps: tuple, today):
+    """Heatmap of the activity calendar: one row per weekday (Monday first), one column per week since the start date"""
+    dates, activities = generate_activity_calendar(timestamps, today)
+    
+    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    offsets = np.arange(len(dates))
+    weeks = offsets // 7
+    calendar_grid = np.zeros((7, weeks[-1] + 1), dtype=np.int32)
+    calendar_grid[(dates[0].weekday() + offsets) % 7, weeks] = activities
+    
+    fig_heatmap = px.imshow(
+        calendar_grid,
+        x=list(range(calendar_grid.shape[1])),
+        y=day_order,
+        labels=dict(x="Week", y="Day", color="Activities"),
+        title="Activity Heatmap (Last 90 Days)",
+        color_continuous_scale="Greens"
+    )
+    
+    fig_heatmap.update_layout(
+        height=300,
+        xaxis_title="Week",
+        yaxis_title="",
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    return fig_heatmap
+
+@st.fragment
+def render_learning_goals(avg_score: float):
+    """Sidebar goal widgets; changing a target reruns only this fragment"""
+    st.subheader("🎯 Learning Goals")
+    
+    # Weekly goal
+    weekly_target = st.number_input("Weekly Quiz Target", min_value=1, max_value=20, value=3)
+    
+    # Calculate this week's progress
+    today = datetime.now().date()
+    week_start = today - timedelta(days=today.weekday())
+    
+    completed_dates = quiz_completion_dates(
+        st.session_state.get('user_id'), st.session_state.quiz_stats['count'], st.session_state.quiz_history
+    )
+    this_week_quizzes = int((completed_dates >= np.datetime64(week_start)).sum())
+    
+    st.progress(min(this_week_quizzes / weekly_target, 1.0))
+    st.caption(f"This week: {this_week_quizzes}/{weekly_target} quizzes")
+    
+    # Score goal
+    score_target = st.slider("Target Average Score", 60, 100, 80)
+    
+    if st.session_state.quiz_history:
+        score_progress = min(avg_score / score_target, 1.0)
+        st.progress(score_progress)
+        st.caption(f"Current: {avg_score:.1f}% / {score_target}%")
 
 # Main dashboard content
 if not st.session_state.quiz_history and not st.session_state.documents:
@@ -101,6 +186,10 @@ if not st.session_state.quiz_history and not st.session_state.documents:
             st.switch_page("pages/2_🧠_Quiz_Center.py")
     st.stop()
 
+metrics = calculate_performance_metrics(
+    st.session_state.get('user_id'), st.session_state.quiz_stats['count'], st.session_state.quiz_history
+)
+
 # Key metrics row
 st.subheader("📈 Key Metrics")
 
@@ -114,7 +203,7 @@ with col1:
     )
 
 with col2:
-    total_quizzes = len(st.session_state.quiz_history)
+    total_quizzes = st.session_state.quiz_stats['count']
     st.metric(
         label="🎯 Quizzes Taken",
         value=total_quizzes,
@@ -124,24 +213,23 @@ with col2:
 with col3:
     st.metric(
         label="📝 Summaries",
-        value=len(st.session_state.summaries),
+        value=len(st.session_state.summaries_by_id),
         help="Total summaries generated"
     )
 
 with col4:
-    avg_score = 0
-    if st.session_state.quiz_history:
-        scores = [q.get('score', 0) for q in st.session_state.quiz_history]
-        avg_score = sum(scores) / len(scores)
+    avg_score = average_quiz_score()
     
     # Calculate delta from previous average
     delta = None
-    if len(st.session_state.quiz_history) >= 2:
-        recent_scores = scores[-3:] if len(scores) >= 3 else scores[-2:]
-        prev_scores = scores[:-len(recent_scores)]
-        if prev_scores:
-            prev_avg = sum(prev_scores) / len(prev_scores)
-            recent_avg = sum(recent_scores) / len(recent_scores)
+    stats = st.session_state.quiz_stats
+    if stats['count'] >= 2:
+        recent_scores = metrics['scores'][-3:]
+        # Earlier attempts are averaged from the running totals rather than rescanned
+        n_prev = stats['count'] - len(recent_scores)
+        if n_prev > 0:
+            prev_avg = (stats['total_score'] - recent_scores.sum()) / n_prev
+            recent_avg = recent_scores.mean()
             delta = f"{recent_avg - prev_avg:.1f}%"
     
     st.metric(
@@ -153,8 +241,6 @@ with col4:
 
 # Performance analysis
 if st.session_state.quiz_history:
-    metrics = calculate_performance_metrics()
-    
     st.markdown("---")
     st.subheader("🎯 Performance Analysis")
     
@@ -164,35 +250,7 @@ if st.session_state.quiz_history:
     with col1:
         st.markdown("**📈 Score Trend Over Time**")
         
-        # Prepare data for trend chart
-        quiz_dates = []
-        quiz_scores = []
-        quiz_types = []
-        
-        for i, quiz in enumerate(st.session_state.quiz_history):
-            quiz_dates.append(i + 1)  # Use quiz number as x-axis
-            quiz_scores.append(quiz.get('score', 0))
-            quiz_types.append(quiz.get('type', 'unknown').replace('_', ' ').title())
-        
-        # Create trend chart
-        fig = px.line(
-            x=quiz_dates,
-            y=quiz_scores,
-            title="Quiz Score Progression",
-            labels={'x': 'Quiz Number', 'y': 'Score (%)'},
-            markers=True
-        )
-        
-        # Add target line at 80%
-        fig.add_hline(y=80, line_dash="dash", line_color="green", 
-                     annotation_text="Target: 80%")
-        
-        fig.update_layout(
-            showlegend=False,
-            height=300,
-            margin=dict(l=20, r=20, t=40, b=20)
-        )
-        
+        fig = score_trend_figure(st.session_state.get('user_id'), st.session_state.quiz_stats['count'], metrics['scores'])
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
@@ -216,26 +274,14 @@ if st.session_state.quiz_history:
     
     if len(metrics['type_breakdown']) > 1:
         col1, col2 = st.columns(2)
+        fig_pie, fig_bar = quiz_type_figures(st.session_state.get('user_id'), st.session_state.quiz_stats['count'], metrics)
         
         with col1:
             # Quiz type distribution
-            fig_pie = px.pie(
-                values=list(metrics['type_breakdown'].values()),
-                names=[t.replace('_', ' ').title() for t in metrics['type_breakdown'].keys()],
-                title="Quiz Type Distribution"
-            )
-            fig_pie.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
             st.plotly_chart(fig_pie, use_container_width=True)
         
         with col2:
             # Average scores by type
-            fig_bar = px.bar(
-                x=[t.replace('_', ' ').title() for t in metrics['type_averages'].keys()],
-                y=list(metrics['type_averages'].values()),
-                title="Average Score by Quiz Type",
-                labels={'x': 'Quiz Type', 'y': 'Average Score (%)'}
-            )
-            fig_bar.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
             st.plotly_chart(fig_bar, use_container_width=True)
     else:
         # Single type display
@@ -249,54 +295,19 @@ st.markdown("---")
 st.subheader("📅 Activity Calendar")
 
 if st.session_state.activity_log:
-    dates, activities = generate_activity_calendar()
-    
-    # Create calendar heatmap
-    df_calendar = pd.DataFrame({
-        'Date': dates,
-        'Activities': activities,
-        'Day': [d.strftime('%A') for d in dates],
-        'Week': [(d - dates[0]).days // 7 for d in dates]
-    })
-    
-    # Pivot for heatmap
-    calendar_pivot = df_calendar.pivot_table(
-        index='Day',
-        columns='Week',
-        values='Activities',
-        fill_value=0
-    )
-    
-    # Reorder days
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    calendar_pivot = calendar_pivot.reindex(day_order)
-    
-    fig_heatmap = px.imshow(
-        calendar_pivot,
-        labels=dict(x="Week", y="Day", color="Activities"),
-        title="Activity Heatmap (Last 90 Days)",
-        color_continuous_scale="Greens"
-    )
-    
-    fig_heatmap.update_layout(
-        height=300,
-        xaxis_title="Week",
-        yaxis_title="",
-        margin=dict(l=20, r=20, t=40, b=20)
-    )
+    timestamps = tuple(activity['timestamp'] for activity in st.session_state.activity_log)
+    today = datetime.now().date()
+    dates, activities = generate_activity_calendar(timestamps, today)
     
-    st.plotly_chart(fig_heatmap, use_container_width=True)
+    st.plotly_chart(activity_heatmap_figure(timestamps, today), use_container_width=True)
     
     # Activity summary
-    total_active_days = sum(1 for a in activities if a > 0)
-    current_streak = 0
+    active = np.asarray(activities) > 0
+    total_active_days = int(active.sum())
     
-    # Calculate current streak
-    for activity in reversed(activities):
-        if activity > 0:
-            current_streak += 1
-        else:
-            break
+    # Calculate current streak: active days since the most recent inactive one
+    inactive_days = np.flatnonzero(~active)
+    current_streak = int(len(active) - 1 - inactive_days[-1]) if inactive_days.size else len(active)
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -314,21 +325,9 @@ else:
 st.markdown("---")
 st.subheader("🕒 Recent Activity")
 
-if st.session_state.activity_log:
-    # Show last 10 activities
-    recent_activities = st.session_state.activity_log[-10:]
-    
-    for activity in reversed(recent_activities):
-        timestamp = activity['timestamp']
-        action = activity['action']
-        
-        # Format timestamp
-        try:
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            time_str = dt.strftime('%m/%d %H:%M')
-        except:
-            time_str = timestamp
-        
+if st.session_state.recent_activities_fmt:
+    # Show last 10 activities, newest first; they are formatted when logged
+    for time_str, action in reversed(st.session_state.recent_activities_fmt):
         st.info(f"**{time_str}** - {action}")
 
 else:
@@ -351,8 +350,7 @@ if st.session_state.quiz_history:
     
     # Activity insights
     if len(st.session_state.quiz_history) >= 5:
-        recent_scores = [q.get('score', 0) for q in st.session_state.quiz_history[-5:]]
-        if all(score >= 80 for score in recent_scores):
+        if (metrics['scores'][-5:] >= 80).all():
             insights.append("🔥 Great consistency! Your recent scores are all above 80%.")
     
     # Content insights
@@ -366,8 +364,8 @@ if st.session_state.documents:
         insights.append("🔬 Great mix of academic papers and personal documents!")
 
 # Summary insights
-if len(st.session_state.summaries) > 0:
-    summary_ratio = len(st.session_state.summaries) / len(st.session_state.documents) if st.session_state.documents else 0
+if len(st.session_state.summaries_by_id) > 0:
+    summary_ratio = len(st.session_state.summaries_by_id) / len(st.session_state.documents) if st.session_state.documents else 0
     if summary_ratio >= 0.5:
         insights.append("📝 Excellent! You're creating summaries for most of your documents.")
 
@@ -379,27 +377,4 @@ else:
 
 # Goals section
 with st.sidebar:
-    st.subheader("🎯 Learning Goals")
-    
-    # Weekly goal
-    weekly_target = st.number_input("Weekly Quiz Target", min_value=1, max_value=20, value=3)
-    
-    # Calculate this week's progress
-    today = datetime.now().date()
-    week_start = today - timedelta(days=today.weekday())
-    
-    this_week_quizzes = sum(
-        1 for quiz in st.session_state.quiz_history
-        if get_date_from_iso(quiz.get('completed_at', '')) >= week_start
-    )
-    
-    st.progress(min(this_week_quizzes / weekly_target, 1.0))
-    st.caption(f"This week: {this_week_quizzes}/{weekly_target} quizzes")
-    
-    # Score goal
-    score_target = st.slider("Target Average Score", 60, 100, 80)
-    
-    if st.session_state.quiz_history:
-        score_progress = min(avg_score / score_target, 1.0)
-        st.progress(score_progress)
-        st.caption(f"Current: {avg_score:.1f}% / {score_target}%")
+    render_learning_goals(avg_score)
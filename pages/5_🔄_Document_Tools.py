@@ -1,8 +1,15 @@
+import logging
 import streamlit as st
 import google.generativeai as genai
 from backend.auth import check_authentication, render_logout_button
-from backend.utils import initialize_session_state, get_document_by_id
-from backend.orchestrator import AIOrchestrator
+from backend.utils import (
+    initialize_session_state, get_document_by_id, get_document_options, get_document_titles, document_fingerprint,
+    document_preview
+)
+from backend.orchestrator import get_orchestrator
+from backend.embeddings import get_embeddings
+from backend.embed_cache import LRUEmbeddingCache
+from backend import json_compat
 
 # Page configuration
 st.set_page_config(
@@ -23,16 +30,38 @@ initialize_session_state()
 render_logout_button()
 
 # Initialize AI orchestrator
-@st.cache_resource
-def get_orchestrator():
-    return AIOrchestrator()
-
 try:
     orchestrator = get_orchestrator()
 except ValueError as e:
     st.error(f"AI Service Error: {e}")
     st.stop()
 
+# Only the documents most similar to the concept are sent to the model
+CROSS_REFERENCE_CANDIDATES = 10
+
+@st.cache_resource(show_spinner=False)
+def get_cross_reference_cache() -> LRUEmbeddingCache:
+    """Cross-reference results shared across reruns and sessions, expiring after an hour"""
+    return LRUEmbeddingCache(capacity=256, ttl=3600)
+
+def find_cross_references(concept: str, documents: list, on_progress=None) -> list:
+    """Relevance results for each document, reused for the same concept over documents with unchanged content"""
+    # An explicit lookup rather than st.cache_data: on_progress draws page elements, which st.cache_data
+    # would try to replay on a hit
+    key = json_compat.dumps([concept, [[doc['id'], document_fingerprint(doc)] for doc in documents]])
+    cache = get_cross_reference_cache()
+    results = cache.get(key)
+    if results is None:
+        results = get_orchestrator().assess_relevance_many(concept, documents, on_progress=on_progress)
+        # A failed assessment comes back empty; only complete sweeps are kept so failures are retried
+        if all(results):
+            cache.put(key, results)
+    return results
+
+def is_reference(result: dict) -> bool:
+    """Whether a relevance result is strong enough to list"""
+    return bool(result.get('is_relevant')) and result.get('relevance_score', 0) > 3
+
 st.title("🔄 Document Tools")
 st.markdown("Compare documents and find cross-references across your library.")
 
@@ -52,33 +81,34 @@ with tab1:
     # Document selection
     col1, col2 = st.columns(2)
     
-    doc_options = {doc['title']: doc['id'] for doc in st.session_state.documents}
+    doc_options = get_document_options()
+    doc_titles = get_document_titles()
     
     with col1:
         st.markdown("**📄 First Document**")
         doc1_title = st.selectbox(
             "Select first document",
-            options=list(doc_options.keys()),
+            options=doc_titles,
             key="doc1"
         )
         doc1 = get_document_by_id(doc_options[doc1_title])
         
         if doc1:
             st.info(f"**Words:** {doc1.get('word_count', 0):,}")
-            st.text_area("Preview", doc1['content'][:300] + "...", height=150, disabled=True, key="preview1")
+            st.text_area("Preview", document_preview(doc1), height=150, disabled=True, key="preview1")
     
     with col2:
         st.markdown("**📄 Second Document**")
         doc2_title = st.selectbox(
             "Select second document",
-            options=list(doc_options.keys()),
+            options=doc_titles,
             key="doc2"
         )
         doc2 = get_document_by_id(doc_options[doc2_title])
         
         if doc2:
             st.info(f"**Words:** {doc2.get('word_count', 0):,}")
-            st.text_area("Preview", doc2['content'][:300] + "...", height=150, disabled=True, key="preview2")
+            st.text_area("Preview", document_preview(doc2), height=150, disabled=True, key="preview2")
     
     # Comparison options
     st.markdown("---")
@@ -99,57 +129,36 @@ with tab1:
         if doc1['id'] == doc2['id']:
             st.error("Please select two different documents to compare.")
         else:
-            with st.spinner("Analyzing documents..."):
-                # Create comparison prompt
-                prompt = f"""
-                Compare the following two documents and provide a {comparison_type.lower()} analysis.
-                Detail level: {detail_level}
-                
-                Document 1: {doc1['title']}
-                Content: {doc1['content'][:2000]}...
-                
-                Document 2: {doc2['title']}
-                Content: {doc2['content'][:2000]}...
-                
-                Please provide:
-                1. Main similarities between the documents
-                2. Key differences in content and approach
-                3. Unique insights from each document
-                4. Synthesis of both documents
-                
-                Format your response in clear markdown with headers and bullet points.
-                """
+            st.markdown("---")
+            st.subheader(f"📊 Comparison: {doc1['title']} vs {doc2['title']}")
+            try:
+                # Render the analysis as it is generated instead of waiting for the whole response
+                comparison = st.write_stream(
+                    orchestrator.compare_documents_stream(doc1, doc2, comparison_type, detail_level)
+                )
                 
-                try:
-                    response = orchestrator.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
+                if comparison:
+                    # Export option
+                    export_text = "".join([
+                        "# Document Comparison\n\n",
+                        "## Documents\n",
+                        f"- **Document 1:** {doc1['title']}\n",
+                        f"- **Document 2:** {doc2['title']}\n\n",
+                        f"## Analysis Type: {comparison_type}\n\n",
+                        comparison
+                    ])
+                    
+                    st.download_button(
+                        "💾 Download Comparison",
+                        data=export_text,
+                        file_name=f"comparison_{doc1['title'][:20]}_{doc2['title'][:20]}.md",
+                        mime="text/markdown"
                     )
+                else:
+                    st.error("Failed to generate comparison.")
                     
-                    if response.text:
-                        st.markdown("---")
-                        st.subheader(f"📊 Comparison: {doc1['title']} vs {doc2['title']}")
-                        st.markdown(response.text)
-                        
-                        # Export option
-                        export_text = f"# Document Comparison\n\n"
-                        export_text += f"## Documents\n"
-                        export_text += f"- **Document 1:** {doc1['title']}\n"
-                        export_text += f"- **Document 2:** {doc2['title']}\n\n"
-                        export_text += f"## Analysis Type: {comparison_type}\n\n"
-                        export_text += response.text
-                        
-                        st.download_button(
-                            "💾 Download Comparison",
-                            data=export_text,
-                            file_name=f"comparison_{doc1['title'][:20]}_{doc2['title'][:20]}.md",
-                            mime="text/markdown"
-                        )
-                    else:
-                        st.error("Failed to generate comparison.")
-                        
-                except Exception as e:
-                    st.error(f"Error generating comparison: {e}")
+            except Exception as e:
+                st.error(f"Error generating comparison: {e}")
 
 with tab2:
     st.subheader("Cross-Reference Analysis")
@@ -163,54 +172,52 @@ with tab2:
     )
     
     if search_concept and st.button("🔗 Find Cross-References", type="primary"):
+        progress_bar = st.progress(0, text="Searching across documents...")
+        partial_results = st.empty()
+        
+        def show_progress(done, total, results):
+            """Update the progress bar and list the matches found so far"""
+            progress_bar.progress(done / total, text=f"Assessed {done} of {total} documents...")
+            found = sorted(
+                ((result.get('relevance_score', 0), doc['title']) for doc, result in zip(documents, results)
+                 if result and is_reference(result)),
+                reverse=True
+            )
+            if found:
+                partial_results.markdown("\n".join(f"- **{title}** ({score}/10)" for score, title in found))
+        
         with st.spinner("Searching across documents..."):
             references = []
             
-            # Search through all documents
-            for doc in st.session_state.documents:
-                prompt = f"""
-                Analyze if the following document discusses or relates to the concept: "{search_concept}"
-                
-                Document: {doc['title']}
-                Content: {doc['content'][:1500]}...
-                
-                If relevant, provide:
-                1. How this document relates to "{search_concept}" (1-2 sentences)
-                2. Key relevant quotes or sections
-                3. Relevance score (0-10)
-                
-                Return JSON format:
-                {{
-                    "is_relevant": true/false,
-                    "relevance_score": 0-10,
-                    "relationship": "description",
-                    "key_points": ["point1", "point2"]
-                }}
-                """
-                
+            # Shortlist indexed documents by embedding similarity. Documents the vector store doesn't have yet
+            # (they are indexed when the Library page is opened) can't be ranked, so they are always assessed.
+            embeddings = get_embeddings()
+            candidate_ids = set(embeddings.rank_documents(
+                search_concept, k=CROSS_REFERENCE_CANDIDATES, document_ids=st.session_state.documents_by_id
+            ))
+            documents = [
+                doc for doc in st.session_state.documents
+                if doc['id'] in candidate_ids or not embeddings.has_document(doc['id'])
+            ]
+            
+            # Assess the shortlist concurrently; repeated searches over an unchanged library are served from the memo
+            results = find_cross_references(search_concept.lower().strip(), documents, show_progress)
+            progress_bar.empty()
+            partial_results.empty()
+            failed = sum(1 for result in results if not result)
+            if failed:
+                st.warning(f"Could not assess {failed} of {len(documents)} documents. Try the search again.")
+            for doc, result in zip(documents, results):
                 try:
-                    from google.genai import types
-                    response = orchestrator.client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt,
-                        config=types.GenerateContentConfig(
-                            response_mime_type="application/json"
-                        )
-                    )
-                    
-                    if response.text:
-                        import json
-                        result = json.loads(response.text)
-                        
-                        if result.get('is_relevant') and result.get('relevance_score', 0) > 3:
-                            references.append({
-                                'document': doc,
-                                'score': result.get('relevance_score', 0),
-                                'relationship': result.get('relationship', ''),
-                                'key_points': result.get('key_points', [])
-                            })
-                except:
-                    continue
+                    if is_reference(result):
+                        references.append({
+                            'document': doc,
+                            'score': result.get('relevance_score', 0),
+                            'relationship': result.get('relationship', ''),
+                            'key_points': result.get('key_points', [])
+                        })
+                except Exception as e:
+                    logging.warning(f"Skipping malformed relevance result for {doc['title']}: {e}")
             
             # Display results
             if references:
@@ -219,11 +226,13 @@ with tab2:
                 
                 st.success(f"Found {len(references)} documents related to '{search_concept}'")
                 
-                # Export data
-                export_text = f"# Cross-Reference Analysis\n\n"
-                export_text += f"**Concept:** {search_concept}\n"
-                export_text += f"**Documents Found:** {len(references)}\n\n"
-                export_text += "---\n\n"
+                # Export data, joined once at the end
+                export_parts = [
+                    "# Cross-Reference Analysis\n\n",
+                    f"**Concept:** {search_concept}\n",
+                    f"**Documents Found:** {len(references)}\n\n",
+                    "---\n\n"
+                ]
                 
                 for ref in references:
                     with st.expander(f"📄 {ref['document']['title']} (Relevance: {ref['score']}/10)"):
@@ -240,18 +249,19 @@ with tab2:
                             st.switch_page("pages/1_📚_Document_Library.py")
                     
                     # Add to export
-                    export_text += f"## {ref['document']['title']}\n"
-                    export_text += f"**Relevance:** {ref['score']}/10\n"
-                    export_text += f"**Relationship:** {ref['relationship']}\n"
-                    export_text += "**Key Points:**\n"
-                    for point in ref['key_points']:
-                        export_text += f"- {point}\n"
-                    export_text += "\n"
+                    export_parts.extend([
+                        f"## {ref['document']['title']}\n",
+                        f"**Relevance:** {ref['score']}/10\n",
+                        f"**Relationship:** {ref['relationship']}\n",
+                        "**Key Points:**\n"
+                    ])
+                    export_parts.extend(f"- {point}\n" for point in ref['key_points'])
+                    export_parts.append("\n")
                 
                 # Download button
                 st.download_button(
                     "💾 Download Cross-Reference Report",
-                    data=export_text,
+                    data="".join(export_parts),
                     file_name=f"cross_reference_{search_concept.replace(' ', '_')}.md",
                     mime="text/markdown"
                 )